@@ -17,7 +17,8 @@ class RQCReviewerOptingDecisionForReviewAssignmentAdmin(admin.ModelAdmin):
     list_display = ('review_assignment', 'opting_status', 'sent_to_rqc')
 
 class RQCDelayedCallAdmin(admin.ModelAdmin):
-    list_display = ('article', 'remaining_tries', 'last_attempt_at', 'failure_reason')
+    list_display = ('article', 'remaining_tries', 'last_attempt_at', 'next_attempt_at', 'failure_reason', 'claimed_by')
+    readonly_fields = ('failure_history',)
 
 admin.site.register(RQCReviewerOptingDecision, RQCReviewerOptingDecisionAdmin)
 admin.site.register(RQCReviewerOptingDecisionForReviewAssignment, RQCReviewerOptingDecisionForReviewAssignmentAdmin)
@@ -0,0 +1,3 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+"""
\ No newline at end of file
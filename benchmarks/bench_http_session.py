@@ -0,0 +1,49 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+Compares the latency of cold calls (a new connection per call, as with the module level
+requests.get) with warm calls over the pooled session from http_session.
+Run from the Janeway src directory:
+    python -m plugins.rqc_adapter.benchmarks.bench_http_session
+"""
+import statistics
+import time
+
+import requests
+
+from plugins.rqc_adapter.benchmarks.stub_server import start_stub_server
+from plugins.rqc_adapter.http_session import get_session, reset_session
+
+ITERATIONS = 200
+
+
+def measure(call, url, iterations=ITERATIONS):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call(url, timeout=5)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def report(name, timings):
+    print(f'{name:<6} mean {statistics.mean(timings):.3f} ms  '
+          f'median {statistics.median(timings):.3f} ms  '
+          f'max {max(timings):.3f} ms')
+
+
+def main():
+    server, base_url = start_stub_server()
+    url = f'{base_url}/api/mhs_apikeycheck/1'
+    try:
+        report('cold', measure(requests.get, url))
+        reset_session()
+        session = get_session()
+        report('warm', measure(session.get, url))
+    finally:
+        reset_session()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
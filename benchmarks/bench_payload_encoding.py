@@ -0,0 +1,106 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+Compares the encoding work per call to mhs_submission for a payload with 20 reviews of
+200 000 characters each. Before, the payload was encoded for the debug log, by requests and
+for the hash. Now it is encoded once by serialization.encode_json and the bytes are reused.
+Run from the Janeway src directory:
+    python -m plugins.rqc_adapter.benchmarks.bench_payload_encoding
+"""
+import hashlib
+import json
+import random
+import string
+import statistics
+import time
+
+from plugins.rqc_adapter import serialization
+
+ITERATIONS = 20
+REVIEWS = 20
+REVIEW_LENGTH = 200000
+
+
+def create_payload(reviews=REVIEWS, review_length=REVIEW_LENGTH):
+    # Random words compress roughly like real review texts. Non-ASCII characters make sure
+    # that ensure_ascii=False matters as it does for real reviews.
+    words = ('die', 'Methodik', 'ist', 'nachvollziehbar', 'Ergebnisse', 'überzeugen', 'the', 'results',
+             'are', 'convincing', 'although', 'sample', 'size', 'small', 'Abbildung', 'unklar', 'revise')
+    rng = random.Random(0)
+    text = '<p>'
+    while len(text) < review_length:
+        text += rng.choice(words) + ' ' + ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9))) + ' '
+    text = text[:review_length]
+    return {
+        'interactive_user': '',
+        'mhs_submissionpage': '',
+        'title': 'Benchmark Article',
+        'external_uid': '1',
+        'visible_uid': '1',
+        'submitted': '2025-01-01T00:00:00Z',
+        'author_set': [{'email': 'author@example.com', 'firstname': 'A', 'lastname': 'B',
+                        'orcid_id': None, 'order_number': 1}],
+        'edassgmt_set': [{'email': 'editor@example.com', 'firstname': 'E', 'lastname': 'F',
+                          'orcid_id': None, 'level': 1}],
+        'review_set': [{
+            'visible_id': str(num),
+            'invited': '2025-01-01T00:00:00Z',
+            'agreed': '2025-01-02T00:00:00Z',
+            'expected': '2025-01-20T00:00:00Z',
+            'submitted': '2025-01-10T00:00:00Z',
+            'text': text,
+            'is_html': True,
+            'suggested_decision': 'ACCEPT',
+            'reviewer': {'email': f'reviewer{num}@example.com', 'firstname': 'R', 'lastname': 'S',
+                         'orcid_id': None},
+            'attachment_set': [],
+        } for num in range(1, reviews + 1)],
+        'decision': 'ACCEPT',
+    }
+
+
+def encode_before(post_data):
+    json.dumps(post_data, indent=2, ensure_ascii=False)  # Debug log line
+    body = json.dumps(post_data, allow_nan=False).encode('utf-8')  # requests.post(json=...)
+    canonical_json = json.dumps(post_data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    hashlib.sha256(canonical_json.encode('utf-8')).hexdigest()
+    return body
+
+
+def encode_after(post_data):
+    body = serialization.encode_json(post_data)
+    hashlib.sha256(body).hexdigest()
+    return body
+
+
+def measure(encode, post_data, iterations=ITERATIONS):
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        body = encode(post_data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, len(body)
+
+
+def report(name, timings, size):
+    print(f'{name:<14} mean {statistics.mean(timings):8.3f} ms  '
+          f'median {statistics.median(timings):8.3f} ms  body {size / 1_000_000:.1f} MB')
+
+
+def main():
+    post_data = create_payload()
+    report('before', *measure(encode_before, post_data))
+    orjson = serialization.orjson
+    try:
+        serialization.orjson = None
+        report('after (json)', *measure(encode_after, post_data))
+    finally:
+        serialization.orjson = orjson
+    if orjson is not None:
+        report('after (orjson)', *measure(encode_after, post_data))
+    else:
+        print('orjson is not installed.')
+
+
+if __name__ == '__main__':
+    main()
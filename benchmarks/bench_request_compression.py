@@ -0,0 +1,74 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+Compares bytes on the wire and end-to-end latency of uncompressed and gzip-compressed
+mhs_submission bodies (see REQUEST_COMPRESSION_ENABLED) at several payload sizes.
+The stub server decompresses gzip bodies like a server that supports them would.
+Run from the Janeway src directory:
+    python -m plugins.rqc_adapter.benchmarks.bench_request_compression
+"""
+import gzip
+import statistics
+import time
+
+from plugins.rqc_adapter.benchmarks.bench_payload_encoding import create_payload
+from plugins.rqc_adapter.benchmarks.stub_server import StubRQCHandler, start_stub_server
+from plugins.rqc_adapter.config import REQUEST_COMPRESSION_LEVEL
+from plugins.rqc_adapter.http_session import get_session, reset_session
+from plugins.rqc_adapter.serialization import encode_json
+
+ITERATIONS = 20
+# (number of reviews, characters per review)
+PAYLOAD_SIZES = [(1, 2000), (5, 20000), (20, 20000), (20, 200000)]
+
+
+class DecompressingStubRQCHandler(StubRQCHandler):
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        StubRQCHandler.received_bytes += length
+        if self.headers.get('Content-Encoding') == 'gzip':
+            gzip.decompress(body)
+        response_body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+
+def measure(session, url, body, compress, iterations=ITERATIONS):
+    timings = []
+    StubRQCHandler.received_bytes = 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        headers = {'Content-Type': 'application/json'}
+        data = body
+        if compress:
+            data = gzip.compress(body, compresslevel=REQUEST_COMPRESSION_LEVEL)
+            headers['Content-Encoding'] = 'gzip'
+        session.post(url, data=data, headers=headers, timeout=30)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, StubRQCHandler.received_bytes // iterations
+
+
+def main():
+    server, base_url = start_stub_server(DecompressingStubRQCHandler)
+    url = f'{base_url}/api/mhs_submission/1/1'
+    try:
+        session = get_session()
+        for reviews, review_length in PAYLOAD_SIZES:
+            body = encode_json(create_payload(reviews, review_length))
+            for name, compress in (('identity', False), ('gzip', True)):
+                timings, wire_bytes = measure(session, url, body, compress)
+                print(f'{reviews:>2} reviews x {review_length:>6} chars  {name:<8} '
+                      f'{wire_bytes / 1000:9.1f} kB on the wire  '
+                      f'mean {statistics.mean(timings):8.3f} ms  median {statistics.median(timings):8.3f} ms')
+    finally:
+        reset_session()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+A minimal local stand-in for the RQC API that is used by the benchmarks.
+It answers every request with 200 and an empty JSON object and keeps connections alive.
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubRQCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    # Total number of request body bytes received, for benchmarks that measure bytes on the wire.
+    received_bytes = 0
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length', 0))
+        if length:
+            self.rfile.read(length)
+            StubRQCHandler.received_bytes += length
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self._respond()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(handler=StubRQCHandler):
+    """
+    Starts the stub server on a free local port in a daemon thread.
+    :param handler: Request handler class
+    :return: tuple (server, base url)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f'http://{host}:{port}'
@@ -0,0 +1,131 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the circuit breaker around calls to the RQC API.
+If RQC is unavailable for several calls in a row the breaker opens and calls fail immediately
+instead of waiting for the timeout. After a while a single call is let through as a probe.
+If it succeeds the breaker closes, otherwise it opens again.
+The state is kept in Django's cache so that it is shared by all workers that use the same cache.
+"""
+import time
+
+from django.core.cache import caches
+
+from utils.logger import get_logger
+
+from plugins.rqc_adapter.config import CIRCUIT_BREAKER_CACHE_ALIAS, CIRCUIT_BREAKER_ENABLED, \
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_FAILURE_WINDOW, CIRCUIT_BREAKER_RESET_TIMEOUT, \
+    CIRCUIT_BREAKER_PROBE_TIMEOUT
+
+logger = get_logger(__name__)
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                 failure_window=CIRCUIT_BREAKER_FAILURE_WINDOW, reset_timeout=CIRCUIT_BREAKER_RESET_TIMEOUT,
+                 probe_timeout=CIRCUIT_BREAKER_PROBE_TIMEOUT, cache_alias=CIRCUIT_BREAKER_CACHE_ALIAS):
+        """
+        :param name: str: Name of the breaker. Breakers with the same name share their state.
+        :param failure_threshold: int: Number of failures in a row that open the breaker
+        :param failure_window: int: Seconds after which counted failures are forgotten
+        :param reset_timeout: int: Seconds the breaker stays open before a probe is let through
+        :param probe_timeout: int: Seconds after which another probe is let through if the result
+            of a probe was not recorded, e.g. because the process crashed
+        :param cache_alias: str: Alias of the Django cache that holds the state
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        self.probe_timeout = probe_timeout
+        self.cache_alias = cache_alias
+        self.open_until_key = f'rqc_adapter:circuit_breaker:{name}:open_until'
+        self.failures_key = f'rqc_adapter:circuit_breaker:{name}:failures'
+        self.probe_key = f'rqc_adapter:circuit_breaker:{name}:probe'
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    @property
+    def state(self) -> str:
+        open_until = self.cache.get(self.open_until_key)
+        if open_until is None:
+            return self.CLOSED
+        if time.time() < open_until:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self) -> bool:
+        """
+        :return: True if a call may be made. In the half-open state only one caller gets True.
+        """
+        return self.acquire() is not None
+
+    def acquire(self) -> str | None:
+        """
+        :return: str: CLOSED if a call may be made, HALF_OPEN if it may be made as the single probe.
+            None if no call may be made.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return self.CLOSED
+        if state == self.OPEN:
+            return None
+        # add is atomic, so only one caller becomes the probe.
+        return self.HALF_OPEN if self.cache.add(self.probe_key, True, self.probe_timeout) else None
+
+    def record_success(self, probe=False):
+        """
+        Forgets counted failures. Only the probe closes the breaker. Calls that were already
+        made when the breaker opened don't tell whether RQC is available again.
+        :param probe: bool: True if the call was made as the probe, see acquire
+        """
+        if probe:
+            if self.state != self.CLOSED:
+                logger.info(f'RQC is available again. Circuit breaker {self.name} closed.')
+            self.cache.delete_many([self.open_until_key, self.failures_key, self.probe_key])
+        elif self.state == self.CLOSED:
+            self.cache.delete(self.failures_key)
+
+    def record_failure(self, probe=False):
+        """
+        Counts a failure. Opens the breaker if the threshold is reached or if the probe failed.
+        Failures of calls that were already made when the breaker opened are not counted.
+        :param probe: bool: True if the call was made as the probe, see acquire
+        """
+        cache = self.cache
+        if probe:
+            self.open()
+            return
+        if self.state != self.CLOSED:
+            return
+        cache.add(self.failures_key, 0, self.failure_window)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            # The counter expired between add and incr.
+            cache.set(self.failures_key, 1, self.failure_window)
+            failures = 1
+        if failures >= self.failure_threshold:
+            self.open()
+
+    def open(self):
+        logger.warning(f'RQC is unavailable. Circuit breaker {self.name} opened for {self.reset_timeout} seconds.')
+        cache = self.cache
+        # The open state is kept a while longer than the reset timeout so that the breaker
+        # is half-open and not closed once the timeout has passed.
+        cache.set(self.open_until_key, time.time() + self.reset_timeout, self.reset_timeout + self.probe_timeout * 10)
+        cache.delete_many([self.failures_key, self.probe_key])
+
+
+_rqc_circuit_breaker = CircuitBreaker('rqc_api')
+
+def get_circuit_breaker() -> CircuitBreaker | None:
+    """
+    :return: The circuit breaker for calls to the RQC API or None if CIRCUIT_BREAKER_ENABLED is not set
+    """
+    return _rqc_circuit_breaker if CIRCUIT_BREAKER_ENABLED else None
@@ -7,8 +7,108 @@ API_BASE_URL = "https://reviewqualitycollector.org/api"
 API_VERSION = "2025-09-16"
 
 # Request Configuration
-# Timeout value in seconds
-REQUEST_TIMEOUT = 10
+# Timeouts in seconds for each context in which calls are made (see rqc_calls.RQCCallContext).
+# connect and read apply to each request, deadline to the whole call including retries.
+# interactive: an editor clicked the grading button and waits for the page. Fails over to the queue
+# after at most deadline seconds, which covers one request that uses both its connect and read timeout.
+# apikeycheck: the credentials are checked when the settings form is saved. The editor waits as well.
+# implicit: queued calls made by the in-process dispatcher in the web process.
+# background: queued calls made by rqc_make_delayed_calls. Allows long reads for large submissions.
+REQUEST_TIMEOUTS = {
+    'interactive': {'connect': 3.05, 'read': 5, 'deadline': 8},
+    'apikeycheck': {'connect': 3.05, 'read': 5, 'deadline': 8},
+    'implicit': {'connect': 3.05, 'read': 20, 'deadline': 30},
+    'background': {'connect': 5, 'read': 60, 'deadline': 120},
+}
+
+# Compression of the request body of calls to mhs_submission. If enabled, bodies of at least
+# REQUEST_COMPRESSION_MIN_BYTES bytes are sent gzip-compressed. If RQC rejects a compressed body
+# it is sent again uncompressed and compression is disabled until the process restarts.
+# Level 1 is several times faster than higher levels and compresses review texts almost as well.
+REQUEST_COMPRESSION_ENABLED = False
+REQUEST_COMPRESSION_MIN_BYTES = 64 * 1024
+REQUEST_COMPRESSION_LEVEL = 1
+
+# Fast retries. A request that fails with FAST_RETRY_STATUS_CODES or because the connection was
+# reset is repeated right away, up to FAST_RETRY_MAX_ATTEMPTS requests per call, before the call fails
+# (and is queued as a delayed call). The wait before the n-th retry is FAST_RETRY_BACKOFF_BASE * 2 ** (n - 1)
+# seconds, at most FAST_RETRY_BACKOFF_MAX, varied randomly by FAST_RETRY_BACKOFF_JITTER (a fraction).
+# No retry is made if the wait and FAST_RETRY_MIN_REMAINING seconds don't fit into the deadline of the call.
+FAST_RETRY_MAX_ATTEMPTS = 3
+FAST_RETRY_STATUS_CODES = (502, 503, 504)
+FAST_RETRY_BACKOFF_BASE = 0.2
+FAST_RETRY_BACKOFF_MAX = 1
+FAST_RETRY_BACKOFF_JITTER = 0.5
+FAST_RETRY_MIN_REMAINING = 2
+
+# Circuit breaker. After CIRCUIT_BREAKER_FAILURE_THRESHOLD calls in a row (within
+# CIRCUIT_BREAKER_FAILURE_WINDOW seconds) found RQC unavailable, calls fail immediately for
+# CIRCUIT_BREAKER_RESET_TIMEOUT seconds and are queued as delayed calls. Then a single call is made as a probe.
+# The state is kept in the Django cache CIRCUIT_BREAKER_CACHE_ALIAS. Use a cache that is shared by
+# all processes so that they share the state.
+CIRCUIT_BREAKER_ENABLED = True
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5
+CIRCUIT_BREAKER_FAILURE_WINDOW = 300
+CIRCUIT_BREAKER_RESET_TIMEOUT = 60
+# Seconds after which another probe is made if the result of a probe was never recorded.
+# Should be longer than the longest deadline in REQUEST_TIMEOUTS.
+CIRCUIT_BREAKER_PROBE_TIMEOUT = 150
+CIRCUIT_BREAKER_CACHE_ALIAS = 'default'
+
+# Seconds the RQC configuration of a journal (credentials and salt) is cached in each process before
+# the process checks whether it changed. Changes made in the same process are seen immediately.
+JOURNAL_CONFIG_CACHE_TTL = 30
+
+# Connection pool of the HTTP session used for calls to RQC.
+# Number of hosts to keep pools for and number of connections kept alive per host.
+POOL_CONNECTIONS = 2
+POOL_MAXSIZE = 10
+
+# Delayed calls
+# Seconds between two polls of the queue when rqc_make_delayed_calls runs with --daemon
+DAEMON_POLL_INTERVAL = 60
+# Minutes between two runs of the cron job installed by rqc_install_cronjob. Implicit calls at
+# decision time are only queued, so this is how long they wait for the cron job without a worker.
+CRON_INTERVAL = 5
+# Number of attempts that are made for a delayed call
+DELAYED_CALL_MAX_TRIES = 10
+# Number of failed attempts that are kept in the failure history of a delayed call
+DELAYED_CALL_MAX_FAILURE_HISTORY = 20
+# Seconds until the first retry of a failed call. The delay doubles with every failed attempt
+# up to DELAYED_CALL_BACKOFF_MAX and is varied randomly by DELAYED_CALL_BACKOFF_JITTER (a fraction).
+DELAYED_CALL_BACKOFF_BASE = 300
+DELAYED_CALL_BACKOFF_MAX = 86400
+DELAYED_CALL_BACKOFF_JITTER = 0.2
+# Seconds an implicit call waits for further editorial decisions on the same article.
+# Decisions within this window are sent to RQC in one call that carries the latest state.
+IMPLICIT_CALL_DEBOUNCE = 60
+# In-process dispatcher for deployments that can't run rqc_make_delayed_calls as a worker.
+# If enabled, queued calls are made by background threads of the web process when they are due.
+IN_PROCESS_DISPATCHER_ENABLED = False
+IN_PROCESS_DISPATCHER_WORKERS = 2
+# Maximum number of calls scheduled in one process. Further calls are left to rqc_make_delayed_calls.
+IN_PROCESS_DISPATCHER_QUEUE_SIZE = 100
+# Number of queue entries that are claimed by a worker at once
+DELAYED_CALL_CHUNK_SIZE = 100
+# Seconds a worker may hold claimed calls. Calls of a crashed worker are made by another worker
+# after this time, so it must be longer than making DELAYED_CALL_CHUNK_SIZE calls takes.
+DELAYED_CALL_LEASE = 900
+# Maximum number of delayed calls that are made at the same time, in total and per journal
+DELAYED_CALL_MAX_WORKERS = 4
+DELAYED_CALL_MAX_WORKERS_PER_JOURNAL = 2
+
+# Cache for the article data sent to RQC. The cached data of an article is replaced when the models it
+# is built from change (see payload_cache.py). Entries are checked against version stamps in the database,
+# so the cache doesn't need to be shared by all processes. Changes to accounts, such as a renamed reviewer,
+# are only picked up once the entry expires after PAYLOAD_CACHE_TIMEOUT seconds.
+PAYLOAD_CACHE_ALIAS = 'default'
+PAYLOAD_CACHE_TIMEOUT = 3600
+
+# Logging
+# Strings within logged data structures, such as review texts, are truncated to LOG_MAX_FIELD_BYTES bytes.
+# A logged value, such as the body of a request, is truncated to LOG_MAX_VALUE_BYTES bytes.
+LOG_MAX_FIELD_BYTES = 500
+LOG_MAX_VALUE_BYTES = 10000
 
 # Plugin Version
 VERSION = '0.1'
\ No newline at end of file
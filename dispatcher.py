@@ -0,0 +1,211 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the outbox for calls to the mhs_submission endpoint.
+Submissions are queued as RQCDelayedCall objects and sent to RQC later by the dispatcher
+(the rqc_make_delayed_calls command) so that no editorial decision has to wait for RQC.
+"""
+import os
+import socket
+import uuid
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Q
+
+from utils.logger import get_logger
+
+from plugins.rqc_adapter.config import DELAYED_CALL_MAX_TRIES, DELAYED_CALL_LEASE, IMPLICIT_CALL_DEBOUNCE
+from plugins.rqc_adapter.models import RQCDelayedCall
+from plugins.rqc_adapter.rqc_calls import RQCCallContext, RQCErrorCodes, call_mhs_submission
+from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
+from plugins.rqc_adapter.utils import utc_now
+
+logger = get_logger(__name__)
+
+def enqueue_submission(article, failure_reason=None):
+    """
+    Queues a call to the mhs_submission endpoint for the article.
+    There is at most one queued call per article. If one exists it is reused: its tries are reset,
+    a failure is added to its failure history and it is rescheduled.
+    The queue entry is written in the current transaction, so it is committed together with
+    the editorial decision that caused it, and it is discarded if that decision is rolled back.
+    :param article: Article object
+    :param failure_reason: str: Reason of a failed previous attempt. None if no attempt was made yet.
+        If set, the first attempt of the queued call is delayed by the backoff, otherwise by
+        the IMPLICIT_CALL_DEBOUNCE window.
+    :return: RQCDelayedCall object
+    """
+    with transaction.atomic():
+        delayed_call, created = RQCDelayedCall.objects.select_for_update().get_or_create(
+            article=article,
+            defaults={'remaining_tries': DELAYED_CALL_MAX_TRIES},
+        )
+        delayed_call.remaining_tries = DELAYED_CALL_MAX_TRIES
+        if failure_reason is not None:
+            delayed_call.last_attempt_at = utc_now()
+            delayed_call.record_failure(failure_reason)
+            delayed_call.schedule_next_attempt()
+        else:
+            # The data of the article changed. Further decisions within the debounce window
+            # push the call back, so a quick series of decisions results in one call.
+            delayed_call.next_attempt_at = utc_now() + timedelta(seconds=IMPLICIT_CALL_DEBOUNCE)
+        delayed_call.save()
+    transaction.on_commit(
+        lambda: logger.info(f'Queued call to RQC for article {article.pk}.')
+    )
+    return delayed_call
+
+def send_delayed_call(delayed_call, credentials, context=RQCCallContext.BACKGROUND) -> dict:
+    """
+    Builds the current submission data for the article of the queue entry and sends it to RQC.
+    The remaining tries and the time of the attempt are updated but the entry is not deleted.
+    :param delayed_call: RQCDelayedCall object
+    :param credentials: RQCJournalAPICredentials object or JournalConfig of the article's journal
+    :param context: RQCCallContext: Determines the timeouts of the call
+    :return: dict: Response data dictionary. See call_rqc_api for details.
+    """
+    article = delayed_call.article
+    post_data = fetch_post_data(article=article, journal=article.journal)
+    response = call_mhs_submission(credentials.rqc_journal_id,
+                                   credentials.api_key,
+                                   submission_id=article.pk,
+                                   post_data=post_data,
+                                   article=article,
+                                   context=context)
+    # No request was made if the circuit breaker is open, so no try is used up.
+    if response.get('http_status_code') != RQCErrorCodes.CIRCUIT_OPEN:
+        delayed_call.remaining_tries = delayed_call.remaining_tries - 1
+    delayed_call.last_attempt_at = utc_now()
+    if not response['success']:
+        delayed_call.record_failure(str(response.get('http_status_code')))
+        delayed_call.schedule_next_attempt()
+    return response
+
+def generate_worker_id() -> str:
+    """
+    Returns an id that identifies a worker across all nodes.
+    :return: str: host name, process id and a random suffix
+    """
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+def claim_due_calls(worker_id, limit, exclude_journal_ids=(), delayed_call_pk=None) -> list:
+    """
+    Claims up to limit due calls for the worker, oldest first. Rows that are locked or claimed
+    by another worker are skipped, so several workers on several nodes can work on the queue
+    without making a call twice. Claims expire after DELAYED_CALL_LEASE seconds.
+    :param worker_id: str: Id of the claiming worker
+    :param limit: int: Maximum number of calls to claim
+    :param exclude_journal_ids: Ids of journals whose calls should not be claimed
+    :param delayed_call_pk: If set, only the call with this primary key is claimed if it is due
+    :return: list of claimed RQCDelayedCall objects
+    """
+    now = utc_now()
+    with transaction.atomic():
+        claimable = RQCDelayedCall.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+            Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+            next_attempt_at__lte=now,
+        ).exclude(
+            article__journal_id__in=exclude_journal_ids
+        )
+        if delayed_call_pk is not None:
+            claimable = claimable.filter(pk=delayed_call_pk)
+        claimable_ids = list(claimable.order_by('next_attempt_at', 'pk').values_list('pk', flat=True)[:limit])
+        RQCDelayedCall.objects.filter(pk__in=claimable_ids).update(
+            claimed_by=worker_id,
+            claimed_until=now + timedelta(seconds=DELAYED_CALL_LEASE),
+        )
+    return list(
+        RQCDelayedCall.objects.filter(pk__in=claimable_ids, claimed_by=worker_id)
+        .select_related('article__journal').order_by('next_attempt_at', 'pk')
+    )
+
+def release_calls(worker_id, delayed_calls):
+    """
+    Releases the claims of the worker on the given calls so that they can be made by any worker.
+    :param worker_id: str: Id of the worker that holds the claims
+    :param delayed_calls: Iterable of RQCDelayedCall objects
+    """
+    RQCDelayedCall.objects.filter(
+        pk__in=[delayed_call.pk for delayed_call in delayed_calls],
+        claimed_by=worker_id,
+    ).update(claimed_by=None, claimed_until=None)
+
+def save_attempt(worker_id, delayed_call, claimed_next_attempt_at) -> bool:
+    """
+    Saves the result of a failed attempt and releases the claim. Nothing is saved if the lease
+    of the worker has expired and the call was claimed by another worker in the meantime.
+    Nothing but the release of the claim is saved if the call was queued again while the attempt
+    was made (see enqueue_submission), so that the new schedule and tries are kept.
+    :param worker_id: str: Id of the worker that holds the claim
+    :param delayed_call: RQCDelayedCall object
+    :param claimed_next_attempt_at: datetime: next_attempt_at of the call when it was claimed
+    :return: True if the attempt was saved
+    """
+    updated = RQCDelayedCall.objects.filter(
+        pk=delayed_call.pk,
+        claimed_by=worker_id,
+        next_attempt_at=claimed_next_attempt_at,
+    ).update(
+        remaining_tries=delayed_call.remaining_tries,
+        last_attempt_at=delayed_call.last_attempt_at,
+        next_attempt_at=delayed_call.next_attempt_at,
+        failure_reason=delayed_call.failure_reason,
+        failure_history=delayed_call.failure_history,
+        claimed_by=None,
+        claimed_until=None,
+    )
+    if updated:
+        return True
+    if RQCDelayedCall.objects.filter(pk=delayed_call.pk, claimed_by=worker_id) \
+            .update(claimed_by=None, claimed_until=None):
+        logger.info(f'Delayed call {delayed_call.pk} was queued again during the attempt. The attempt was not saved.')
+    else:
+        logger.warning(f'Claim on delayed call {delayed_call.pk} expired before the attempt was saved.')
+    return False
+
+def save_failed_attempt(worker_id, delayed_call, failure_reason) -> bool:
+    """
+    Saves an attempt that failed without a response from RQC, e.g. because building the submission
+    data raised an exception. The attempt uses up a try and the next attempt is scheduled with
+    backoff like for a failed call, so the call doesn't block its journal on every run.
+    :param worker_id: str: Id of the worker that holds the claim
+    :param delayed_call: RQCDelayedCall object as it was claimed
+    :param failure_reason: str: Reason of the failure
+    :return: True if the attempt was saved
+    """
+    claimed_next_attempt_at = delayed_call.next_attempt_at
+    delayed_call.remaining_tries = delayed_call.remaining_tries - 1
+    delayed_call.last_attempt_at = utc_now()
+    delayed_call.record_failure(failure_reason)
+    delayed_call.schedule_next_attempt()
+    return save_attempt(worker_id, delayed_call, claimed_next_attempt_at)
+
+def make_claimed_call(worker_id, delayed_call, credentials, context=RQCCallContext.BACKGROUND) -> bool:
+    """
+    Makes a call that is claimed by the worker. Successful calls are removed from the queue,
+    failed attempts are saved and the claim is released.
+    :param worker_id: str: Id of the worker that holds the claim
+    :param delayed_call: RQCDelayedCall object
+    :param credentials: RQCJournalAPICredentials object or JournalConfig of the article's journal
+    :param context: RQCCallContext: Determines the timeouts of the call
+    :return: True if the call succeeded
+    """
+    article = delayed_call.article
+    article_id = article.pk
+    # A call that is queued again while it is made gets a new next_attempt_at, see enqueue_submission.
+    claimed_next_attempt_at = delayed_call.next_attempt_at
+    response = send_delayed_call(delayed_call, credentials, context)
+    logger.info(f"Delayed call to RQC was attempted for article {article_id}:{article.title}.")
+    if not response['success']:
+        logger.info(f"Delayed call to RQC failed for article {article_id}:{article.title}.")
+        save_attempt(worker_id, delayed_call, claimed_next_attempt_at)
+        return False
+    logger.info(f"Delayed call to RQC succeeded for article {article_id}:{article.title}.")
+    # If a new editorial decision was queued while the call was made the entry was rescheduled.
+    # In that case it is kept so that the new state is sent as well.
+    deleted, _ = RQCDelayedCall.objects.filter(pk=delayed_call.pk,
+                                               next_attempt_at=claimed_next_attempt_at).delete()
+    if not deleted:
+        release_calls(worker_id, [delayed_call])
+    return True
@@ -6,18 +6,20 @@ This file contains the functions that are registered for events in plugin_settin
 from utils.logger import get_logger
 
 from plugins.rqc_adapter.utils import utc_now
-from plugins.rqc_adapter.models import RQCJournalAPICredentials, RQCReviewerOptingDecision, \
-    RQCReviewerOptingDecisionForReviewAssignment
-from plugins.rqc_adapter.rqc_calls import call_mhs_submission
-from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
+from plugins.rqc_adapter.dispatcher import enqueue_submission
+from plugins.rqc_adapter.in_process_dispatcher import schedule_on_commit
+from plugins.rqc_adapter.journal_config import is_rqc_enabled
+from plugins.rqc_adapter.models import RQCReviewerOptingDecision, RQCReviewerOptingDecisionForReviewAssignment, \
+    RQCDelayedCall
 
 logger = get_logger(__name__)
 
 # Called when an article editorial decision changes
-def implicit_call_mhs_submission(**kwargs) -> dict | None:
+def implicit_call_mhs_submission(**kwargs) -> RQCDelayedCall | None:
     """
-    This function makes a call to the MHS submission API. Triggers when the editorial decision
-    of a submission changes.
+    This function queues a call to the MHS submission API. Triggers when the editorial decision
+    of a submission changes. The call itself is made by the dispatcher (see dispatcher.py),
+    so the editorial decision does not wait for RQC.
     """
     # In case of revision requests the article parameter is not present in the kwargs
     revision_request = kwargs.get('revision', None)
@@ -25,18 +27,13 @@ def implicit_call_mhs_submission(**kwargs) -> dict | None:
         article = kwargs.get('article', None)
     else:
         article = revision_request.article
-    request = kwargs['request']
 
     if article is None:
         logger.warning("No article provided. Could not make implicit call to the RQC API.")
         return None
 
-    journal = article.journal
-
     # If there are no RQC credentials no calls should be made.
-    try:
-        credentials = RQCJournalAPICredentials.objects.get(journal=journal)
-    except RQCJournalAPICredentials.DoesNotExist:
+    if not is_rqc_enabled(article.journal_id):
         return None
 
     # If there are no reviews for an article, for instance if an article is declined
@@ -44,15 +41,10 @@ def implicit_call_mhs_submission(**kwargs) -> dict | None:
     if not article.reviewassignment_set.exists():
         return None
 
-    journal_id = credentials.rqc_journal_id
-    api_key = credentials.api_key
-    submission_id = article.pk
-    post_data = fetch_post_data(user=None, article=article, journal= journal)
-    return call_mhs_submission(journal_id=journal_id,
-                               api_key=api_key,
-                               submission_id=submission_id,
-                               post_data=post_data,
-                               article=article)
+    # The submission data is collected when the call is sent so that it reflects the latest state.
+    delayed_call = enqueue_submission(article)
+    schedule_on_commit(delayed_call)
+    return delayed_call
 
 # Executed when ON_REVIEWER_ACCEPTED event happens (when a reviewer accepts a review assignment).
 def create_review_assignment_opting_decision(**kwargs):
@@ -61,16 +53,15 @@ def create_review_assignment_opting_decision(**kwargs):
     :param kwargs: Contains ReviewAssignment object
     """
     review_assignment = kwargs.get("review_assignment")
-    journal = review_assignment.article.journal
-    # Don't create Review Assignment Opting Decisions if no API credentials are present
-    try:
-        RQCJournalAPICredentials.objects.get(journal=journal)
-    except RQCJournalAPICredentials.DoesNotExist:
-        return None
-
     if not review_assignment:
         logger.error('Could not create RQC opting decision: review_assignment is required')
         return None
+    # The journal of the request is used if there is one, so that journals without RQC need no query.
+    request = kwargs.get('request')
+    journal = getattr(request, 'journal', None) or review_assignment.article.journal
+    # Don't create Review Assignment Opting Decisions if no API credentials are present
+    if not is_rqc_enabled(journal.pk):
+        return None
     try:
         decision = RQCReviewerOptingDecision.objects.filter(reviewer=review_assignment.reviewer,
                                                              journal=journal,
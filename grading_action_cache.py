@@ -0,0 +1,91 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the cache for the 'RQC-grade the reviews' action that is rendered on the
+editor's review page (see hooks.render_rqc_grading_action). The rendered action of an article is
+cached under a version stamp of the article that is replaced whenever a review assignment of the
+article is saved or deleted. The stamp is kept in the cache, so a cached action is rendered without
+a query. The action is only a hint for the editor, the data sent to RQC is checked in payload_cache.py. The CSRF token differs per user, so the action is cached with a
+placeholder that is replaced by the token of the current request.
+"""
+import uuid
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.urls import get_script_prefix
+
+from review.models import ReviewAssignment
+
+from plugins.rqc_adapter.config import PAYLOAD_CACHE_TIMEOUT
+from plugins.rqc_adapter.journal_config import has_rqc_journals
+from plugins.rqc_adapter.payload_cache import get_cache
+
+CSRF_TOKEN_PLACEHOLDER = 'rqc-adapter-csrf-token-placeholder'
+
+def grading_action_version_key(article_id) -> str:
+    return f'rqc_adapter:grading_action_version:{article_id}'
+
+def grading_action_key(article_id, version) -> str:
+    return f'rqc_adapter:grading_action:{article_id}:{version}'
+
+def get_grading_action_version(article_id) -> str:
+    """
+    Returns the current version stamp of the article's grading action. A new stamp is created if there is none.
+    :param article_id: Primary key of the article
+    :return: str: Version stamp
+    """
+    cache = get_cache()
+    key = grading_action_version_key(article_id)
+    version = cache.get(key)
+    if version is None:
+        # Another process may create a stamp at the same time. add keeps the first one.
+        cache.add(key, uuid.uuid4().hex, PAYLOAD_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+def bump_grading_action_version(article_id):
+    """
+    Replaces the version stamp of the article's grading action. The stamp is replaced again when the
+    current transaction is committed. Otherwise an action rendered by another process from the state
+    before the commit could be cached under the new stamp.
+    :param article_id: Primary key of the article
+    """
+    def bump():
+        get_cache().set(grading_action_version_key(article_id), uuid.uuid4().hex, PAYLOAD_CACHE_TIMEOUT)
+    bump()
+    transaction.on_commit(bump)
+
+def get_cached_grading_action(article_id, version) -> str | None:
+    """
+    :param article_id: Primary key of the article
+    :param version: str: Version stamp returned by get_grading_action_version
+    :return: str: Rendered grading action with CSRF_TOKEN_PLACEHOLDER or None if there is none for this version
+    """
+    cached = get_cache().get(grading_action_key(article_id, version))
+    # URLs in the action depend on the script prefix, e.g. if a journal is served under a path.
+    if cached is None or cached['script_prefix'] != get_script_prefix():
+        return None
+    return cached['grading_action']
+
+def set_cached_grading_action(article_id, version, grading_action):
+    """
+    Caches the rendered grading action under the given version stamp.
+    :param article_id: Primary key of the article
+    :param version: str: Version stamp returned by get_grading_action_version before the review assignments were loaded
+    :param grading_action: str: Rendered grading action with CSRF_TOKEN_PLACEHOLDER. Empty if no action is shown.
+    """
+    get_cache().set(grading_action_key(article_id, version),
+                    {'script_prefix': get_script_prefix(), 'grading_action': grading_action},
+                    PAYLOAD_CACHE_TIMEOUT)
+
+def invalidate_grading_action(sender, instance, **kwargs):
+    """
+    Signal handler that replaces the version stamp of the article of a saved or deleted review assignment.
+    """
+    # The action is only rendered for journals that use RQC.
+    if instance.article_id is not None and has_rqc_journals():
+        bump_grading_action_version(instance.article_id)
+
+post_save.connect(invalidate_grading_action, sender=ReviewAssignment, dispatch_uid='rqc_adapter_grading_action_save')
+post_delete.connect(invalidate_grading_action, sender=ReviewAssignment,
+                    dispatch_uid='rqc_adapter_grading_action_delete')
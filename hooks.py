@@ -5,27 +5,46 @@ This file contains the functions that register for hooks and determine the rende
 if that hook is triggered.
 """
 
+from django.middleware.csrf import get_token
 from django.template.loader import render_to_string
 
 from review import logic
 from review.models import ReviewAssignment
 
 from plugins.rqc_adapter import forms
-from plugins.rqc_adapter.models import RQCReviewerOptingDecision, RQCJournalAPICredentials
+from plugins.rqc_adapter.grading_action_cache import CSRF_TOKEN_PLACEHOLDER, get_cached_grading_action, \
+    get_grading_action_version, set_cached_grading_action
+from plugins.rqc_adapter.journal_config import is_rqc_enabled
+from plugins.rqc_adapter.models import RQCReviewerOptingDecision
 from plugins.rqc_adapter.utils import has_opted_in_or_out
 
 def render_rqc_grading_action(context):
     """
     Returns the string for rendering the 'Grade in RQC' action in the Editors
     action menu when the 'in_review_editor_actions' hook is triggered.
+    The rendered action is cached per article until one of its review assignments changes.
     """
     request = context['request']
     article = context['article']
     journal = request.journal
     # Only render the element if the journal has valid credentials.
-    has_api_credentials = RQCJournalAPICredentials.objects.filter(journal=journal).exists()
-    if not has_api_credentials:
+    if not is_rqc_enabled(journal.pk):
         return ''
+    # The version is read before the review assignments so that a change in between is not cached.
+    version = get_grading_action_version(article.pk)
+    grading_action = get_cached_grading_action(article.pk, version)
+    if grading_action is None:
+        grading_action = build_rqc_grading_action(article)
+        set_cached_grading_action(article.pk, version, grading_action)
+    return grading_action.replace(CSRF_TOKEN_PLACEHOLDER, get_token(request))
+
+def build_rqc_grading_action(article):
+    """
+    Renders the 'Grade in RQC' action without the request. The CSRF token is left as
+    CSRF_TOKEN_PLACEHOLDER so that the result can be cached.
+    :param article: Article object
+    :return: str: Rendered action or an empty string if no action is shown
+    """
     # If there are no accepted Review Assignments yet no button for grading is shown
     if not ReviewAssignment.objects.filter(article=article, date_requested__isnull=False, date_accepted__isnull = False).exists():
         return ''
@@ -36,7 +55,7 @@ def render_rqc_grading_action(context):
         has_outstanding_reviews = True
     else:
         has_outstanding_reviews = False
-    string = render_to_string('rqc_adapter/grading_action.html', context={'article': context['article'], 'has_outstanding_reviews': has_outstanding_reviews }, request=request)
+    string = render_to_string('rqc_adapter/grading_action.html', context={'article': article, 'has_outstanding_reviews': has_outstanding_reviews, 'csrf_token': CSRF_TOKEN_PLACEHOLDER})
     return string
 
 def render_reviewer_opting_form(context):
@@ -48,6 +67,12 @@ def render_reviewer_opting_form(context):
     journal = request.journal
     user = request.user
 
+    # Only render the opting form if the journal has valid credentials. Usually this needs no query.
+    # Validity of the credentials is checked upon entering the settings (not here).
+    # Additional validation via another API call is too costly.
+    if not is_rqc_enabled(journal.pk):
+        return ''
+
     assignment = context.get('assignment')
     if not assignment:
         return ''
@@ -55,18 +80,11 @@ def render_reviewer_opting_form(context):
     access_code = context.get('access_code')
     if not access_code:
         access_code = logic.get_access_code(request)
-    # Only render the opting form if the journal has valid credentials and user has not made
-    # the decision to opt in or out.
-    # Validity of the credentials is checked upon entering the settings (not here).
-    # Additional validation via another API call is too costly.
-    has_api_credentials = RQCJournalAPICredentials.objects.filter(journal=journal).exists()
-    # Don't display anything. For instance if "One-Click-Access" is enabled.
+    # Users that are not logged in can't participate. For instance if "One-Click-Access" is enabled.
     if not user.is_authenticated:
-        if has_api_credentials:
-            return '<p>This journal uses Review Quality Collector. Login is required to participate.</p>'
-        else:
-            return ''
-    if has_api_credentials and not has_opted_in_or_out(user, journal):
+        return '<p>This journal uses Review Quality Collector. Login is required to participate.</p>'
+    # Only render the opting form if the user has not made the decision to opt in or out.
+    if not has_opted_in_or_out(user, journal):
         form = forms.ReviewerOptingForm(initial=
                                         {'status_selection_field': RQCReviewerOptingDecision.OptingChoices.OPT_IN})
         return render_to_string('rqc_adapter/reviewer_opting_form.html',
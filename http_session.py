@@ -0,0 +1,60 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file provides the pooled HTTP session that is used for all calls to the RQC API.
+Reusing one session per process keeps connections to RQC alive, so that subsequent calls
+don't have to pay for a new TCP and TLS handshake.
+"""
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from plugins.rqc_adapter.config import POOL_CONNECTIONS, POOL_MAXSIZE
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def create_session() -> requests.Session:
+    """
+    Creates a new session with a sized connection pool for the RQC API.
+    Retries are handled by the plugin itself (see RQCDelayedCall) so urllib3 retries are disabled.
+    :return: requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session() -> requests.Session:
+    """
+    Returns the session of the current process. Sockets must not be shared between
+    forked processes (e.g. gunicorn workers with preload), so a new session is created
+    if the process id changed since the session was created.
+    :return: requests.Session
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                # The connections of the parent process are dropped, not closed,
+                # since closing them would affect the parent as well.
+                _session = create_session()
+                _session_pid = pid
+    return _session
+
+def reset_session():
+    """
+    Closes and drops the session of the current process. The next call to get_session
+    creates a new one.
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None and _session_pid == os.getpid():
+            _session.close()
+        _session = None
+        _session_pid = None
@@ -0,0 +1,183 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the optional in-process dispatcher for deployments that cannot run the
+rqc_make_delayed_calls worker. Queued calls are handed to a small thread pool in the web process
+when their transaction commits. Every call stays persisted as RQCDelayedCall, so calls that don't
+fit into the bounded queue, or that are lost when the process exits, are made by the
+rqc_make_delayed_calls command instead.
+"""
+import heapq
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, transaction
+
+from utils.logger import get_logger
+
+from plugins.rqc_adapter.config import IN_PROCESS_DISPATCHER_ENABLED, IN_PROCESS_DISPATCHER_WORKERS, \
+    IN_PROCESS_DISPATCHER_QUEUE_SIZE
+from plugins.rqc_adapter.dispatcher import claim_due_calls, generate_worker_id, make_claimed_call, release_calls
+from plugins.rqc_adapter.journal_config import get_journal_config
+from plugins.rqc_adapter.rqc_calls import RQCCallContext
+from plugins.rqc_adapter.utils import utc_now
+
+logger = get_logger(__name__)
+
+class InProcessDispatcher:
+    """
+    Makes queued calls in background threads of the current process.
+    A scheduler thread waits until a call is due and passes it to the thread pool.
+    The number of calls that are scheduled or in flight is bounded by max_queue_size.
+    """
+
+    def __init__(self, max_workers=IN_PROCESS_DISPATCHER_WORKERS, max_queue_size=IN_PROCESS_DISPATCHER_QUEUE_SIZE):
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.worker_id = None
+        self._condition = threading.Condition()
+        # Heap of (due time, delayed call pk) and the latest due time per delayed call pk.
+        # Entries of the heap whose due time is not the latest one for their call are skipped.
+        self._schedule = []
+        self._due_by_pk = {}
+        self._in_flight = 0
+        self._executor = None
+        self._scheduler = None
+        self._pid = None
+        self._stopped = False
+
+    def submit(self, delayed_call_pk, due_at=None) -> bool:
+        """
+        Schedules the queued call with the given primary key. Scheduling a call again moves it to the new due time.
+        :param delayed_call_pk: Primary key of the RQCDelayedCall object
+        :param due_at: datetime: Time at which the call should be made. Now if None.
+        :return: False if the queue is full. The call is then left to the rqc_make_delayed_calls command.
+        """
+        due_at = due_at or utc_now()
+        with self._condition:
+            self._start()
+            if delayed_call_pk not in self._due_by_pk and \
+                    len(self._due_by_pk) + self._in_flight >= self.max_queue_size:
+                logger.info(f'In-process RQC dispatcher is full. Delayed call {delayed_call_pk} is left in the queue.')
+                return False
+            self._due_by_pk[delayed_call_pk] = due_at
+            heapq.heappush(self._schedule, (due_at, delayed_call_pk))
+            self._condition.notify()
+        return True
+
+    def shutdown(self, wait=True):
+        """
+        Stops the scheduler. Scheduled calls that are not yet in flight stay in the database queue.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+            executor = self._executor if self._pid == os.getpid() else None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def _reset_after_fork(self):
+        """
+        Called in a forked child process. The lock of the parent may be held by one of its threads
+        at the time of the fork, so the child gets a new one. The threads are started on first use.
+        """
+        self._condition = threading.Condition()
+        self._pid = None
+
+    def _start(self):
+        """
+        Starts the threads on first use and again in a forked child process, which does not
+        inherit the threads of its parent (e.g. gunicorn with preload). Must hold the condition.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        self._pid = pid
+        self.worker_id = generate_worker_id()
+        # Schedules inherited from the parent process are made by the parent.
+        self._schedule = []
+        self._due_by_pk = {}
+        self._in_flight = 0
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='rqc-dispatcher')
+        self._scheduler = threading.Thread(target=self._run_scheduler, name='rqc-dispatcher-scheduler', daemon=True)
+        self._scheduler.start()
+
+    def _run_scheduler(self):
+        with self._condition:
+            while not self._stopped:
+                if not self._schedule:
+                    self._condition.wait()
+                    continue
+                due_at, delayed_call_pk = self._schedule[0]
+                if self._due_by_pk.get(delayed_call_pk) != due_at:
+                    heapq.heappop(self._schedule)
+                    continue
+                wait_seconds = (due_at - utc_now()).total_seconds()
+                if wait_seconds > 0:
+                    self._condition.wait(timeout=wait_seconds)
+                    continue
+                heapq.heappop(self._schedule)
+                del self._due_by_pk[delayed_call_pk]
+                self._in_flight += 1
+                self._executor.submit(self._make_call, delayed_call_pk)
+
+    def _make_call(self, delayed_call_pk):
+        retry_at = None
+        try:
+            retry_at = self._make_claimed_call(delayed_call_pk)
+        except Exception as e:
+            logger.error(f'In-process RQC dispatcher failed to make delayed call {delayed_call_pk}: {e}')
+        finally:
+            # Pool threads open their own database connections which have to be closed by them.
+            connections.close_all()
+            with self._condition:
+                self._in_flight -= 1
+        if retry_at is not None:
+            self.submit(delayed_call_pk, retry_at)
+
+    def _make_claimed_call(self, delayed_call_pk):
+        """
+        Claims and makes the call if it is still due.
+        :return: datetime of the next attempt if the call failed and should be retried, None otherwise
+        """
+        claimed = claim_due_calls(self.worker_id, 1, delayed_call_pk=delayed_call_pk)
+        # The call was made, rescheduled or claimed by another worker in the meantime.
+        if not claimed:
+            return None
+        delayed_call = claimed[0]
+        if not delayed_call.is_valid:
+            delayed_call.delete()
+            return None
+        credentials = get_journal_config(delayed_call.article.journal_id)
+        if not credentials.enabled:
+            logger.warning("Delayed call to RQC was attempted but no RQC API credentials found.")
+            release_calls(self.worker_id, [delayed_call])
+            return None
+        if not make_claimed_call(self.worker_id, delayed_call, credentials, RQCCallContext.IMPLICIT) \
+                and delayed_call.is_valid:
+            return delayed_call.next_attempt_at
+        return None
+
+
+_dispatcher = InProcessDispatcher()
+os.register_at_fork(after_in_child=_dispatcher._reset_after_fork)
+
+def get_dispatcher() -> InProcessDispatcher:
+    """
+    Returns the in-process dispatcher. Its threads are started on first use.
+    """
+    return _dispatcher
+
+def schedule_on_commit(delayed_call):
+    """
+    Hands the queued call to the in-process dispatcher once the current transaction is committed.
+    Does nothing unless IN_PROCESS_DISPATCHER_ENABLED is set.
+    :param delayed_call: RQCDelayedCall object
+    """
+    if not IN_PROCESS_DISPATCHER_ENABLED:
+        return
+    delayed_call_pk = delayed_call.pk
+    due_at = delayed_call.next_attempt_at
+    transaction.on_commit(lambda: get_dispatcher().submit(delayed_call_pk, due_at))
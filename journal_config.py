@@ -0,0 +1,223 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the process-local cache of the RQC configuration of the journals:
+whether RQC is enabled, the RQC journal id, the API key and the salt. The ids of the journals that
+use RQC are cached as a set, so that journals without RQC don't need a query to find out.
+Each process checks at most every JOURNAL_CONFIG_CACHE_TTL seconds whether the generation counter
+in the database changed and drops its cached configuration if it did. The counter is incremented
+whenever credentials or a salt are saved or deleted, so the processes on all nodes see changes
+without a shared cache.
+"""
+import threading
+import time
+from dataclasses import dataclass
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+from utils.logger import get_logger
+
+from plugins.rqc_adapter.config import JOURNAL_CONFIG_CACHE_TTL
+from plugins.rqc_adapter.models import RQCConfigGeneration, RQCJournalAPICredentials, RQCJournalSalt
+
+logger = get_logger(__name__)
+
+@dataclass(frozen=True)
+class JournalConfig:
+    """
+    RQC configuration of a journal. Can be used in place of an RQCJournalAPICredentials object.
+    """
+    journal_id: int
+    enabled: bool # True if the journal has RQC API credentials
+    rqc_journal_id: int | None
+    api_key: str | None
+    salt: str | None
+
+def get_generation() -> int:
+    """
+    :return: int: Current value of the generation counter
+    """
+    return RQCConfigGeneration.objects.filter(pk=1).values_list('generation', flat=True).first() or 0
+
+def bump_generation():
+    """
+    Increments the generation counter so that all processes drop their cached configuration.
+    """
+    if not RQCConfigGeneration.objects.filter(pk=1).update(generation=F('generation') + 1):
+        RQCConfigGeneration.objects.get_or_create(pk=1, defaults={'generation': 1})
+
+def load_journal_config(journal_id) -> JournalConfig:
+    """
+    :param journal_id: Primary key of the journal
+    :return: JournalConfig loaded from the database
+    """
+    credentials = RQCJournalAPICredentials.objects.filter(journal_id=journal_id) \
+        .values('rqc_journal_id', 'api_key').first()
+    salt = RQCJournalSalt.objects.filter(journal_id=journal_id).values_list('salt', flat=True).first()
+    if credentials is None:
+        return JournalConfig(journal_id, False, None, None, salt)
+    return JournalConfig(journal_id, True, credentials['rqc_journal_id'], credentials['api_key'], salt)
+
+def load_enabled_journal_ids() -> frozenset:
+    """
+    :return: frozenset: Primary keys of the journals that have RQC API credentials
+    """
+    return frozenset(RQCJournalAPICredentials.objects.values_list('journal_id', flat=True))
+
+class JournalConfigCache:
+
+    def __init__(self, ttl=JOURNAL_CONFIG_CACHE_TTL):
+        """
+        :param ttl: float: Seconds between two checks of the generation counter
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._configs = {}
+        self._enabled_journal_ids = None
+        self._generation = None
+        self._checked_at = None
+        # Incremented whenever entries are dropped. A configuration that was loaded while entries
+        # were dropped may be outdated and is not cached.
+        self._epoch = 0
+
+    def get(self, journal_id) -> JournalConfig:
+        """
+        :param journal_id: Primary key of the journal
+        :return: JournalConfig of the journal. Loaded from the database if it is not cached.
+        """
+        self.validate()
+        config = self._configs.get(journal_id)
+        if config is not None:
+            return config
+        epoch = self._epoch
+        config = load_journal_config(journal_id)
+        with self._lock:
+            if epoch == self._epoch:
+                self._configs[journal_id] = config
+        return config
+
+    def is_enabled(self, journal_id) -> bool:
+        """
+        :param journal_id: Primary key of the journal
+        :return: True if the journal has RQC API credentials
+        """
+        return journal_id in self.get_enabled_journal_ids()
+
+    def get_enabled_journal_ids(self) -> frozenset:
+        """
+        :return: frozenset: Primary keys of the journals that have RQC API credentials
+        """
+        self.validate()
+        enabled_journal_ids = self._enabled_journal_ids
+        if enabled_journal_ids is None:
+            enabled_journal_ids = self.load_enabled_journal_ids()
+        return enabled_journal_ids
+
+    def load_enabled_journal_ids(self) -> frozenset:
+        """
+        Loads the ids of the journals that use RQC and caches them.
+        :return: frozenset: Primary keys of the journals that have RQC API credentials
+        """
+        epoch = self._epoch
+        enabled_journal_ids = load_enabled_journal_ids()
+        with self._lock:
+            if epoch == self._epoch:
+                self._enabled_journal_ids = enabled_journal_ids
+        return enabled_journal_ids
+
+    def validate(self):
+        """
+        Drops all entries if the generation counter changed. The counter is read at most every ttl seconds.
+        """
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.ttl:
+            return
+        generation = get_generation()
+        with self._lock:
+            if generation != self._generation:
+                self._configs.clear()
+                self._enabled_journal_ids = None
+                self._epoch += 1
+                self._generation = generation
+            self._checked_at = now
+
+    def discard(self, journal_id):
+        """
+        Drops the entry of the journal.
+        :param journal_id: Primary key of the journal
+        """
+        with self._lock:
+            self._configs.pop(journal_id, None)
+            self._enabled_journal_ids = None
+            self._epoch += 1
+
+    def clear(self):
+        """
+        Drops all entries. The generation counter is read again on the next access.
+        """
+        with self._lock:
+            self._configs.clear()
+            self._enabled_journal_ids = None
+            self._epoch += 1
+            self._generation = None
+            self._checked_at = None
+
+
+_journal_config_cache = JournalConfigCache()
+
+def get_journal_config(journal_id) -> JournalConfig:
+    """
+    :param journal_id: Primary key of the journal
+    :return: JournalConfig of the journal
+    """
+    return _journal_config_cache.get(journal_id)
+
+def is_rqc_enabled(journal_id) -> bool:
+    """
+    Checks whether the journal uses RQC. Usually no query is needed.
+    :param journal_id: Primary key of the journal
+    :return: True if the journal has RQC API credentials
+    """
+    return _journal_config_cache.is_enabled(journal_id)
+
+def has_rqc_journals() -> bool:
+    """
+    Checks whether any journal uses RQC. Usually no query is needed.
+    :return: True if at least one journal has RQC API credentials
+    """
+    return bool(_journal_config_cache.get_enabled_journal_ids())
+
+def preload_journal_configs():
+    """
+    Loads the ids of the journals that use RQC when the plugin is loaded, so that the first
+    requests don't have to. Failures are only logged, e.g. if the tables don't exist yet.
+    """
+    try:
+        _journal_config_cache.validate()
+        _journal_config_cache.load_enabled_journal_ids()
+    except DatabaseError as e:
+        logger.warning(f'Could not preload the RQC configuration of the journals: {e}')
+
+def clear_journal_configs():
+    """
+    Drops the cached configuration of all journals in this process.
+    """
+    _journal_config_cache.clear()
+
+def invalidate_journal_config(sender, instance, **kwargs):
+    """
+    Signal handler for saved or deleted credentials and salts. Increments the generation counter
+    and drops the cached configuration of the journal in this process, immediately and again when
+    the transaction is committed, because another thread may load the old state until then.
+    """
+    bump_generation()
+    journal_id = instance.journal_id
+    _journal_config_cache.discard(journal_id)
+    transaction.on_commit(lambda: _journal_config_cache.discard(journal_id))
+
+for model in (RQCJournalAPICredentials, RQCJournalSalt):
+    post_save.connect(invalidate_journal_config, sender=model, dispatch_uid=f'rqc_adapter_config_save_{model.__name__}')
+    post_delete.connect(invalidate_journal_config, sender=model,
+                        dispatch_uid=f'rqc_adapter_config_delete_{model.__name__}')
@@ -0,0 +1,85 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the formatting of values that are logged by the plugin.
+Values are wrapped in LogValue and only formatted if a handler emits the message.
+Long strings are truncated and email addresses and bearer tokens are redacted.
+"""
+import re
+
+from plugins.rqc_adapter.config import LOG_MAX_FIELD_BYTES, LOG_MAX_VALUE_BYTES
+
+EMAIL_PATTERN = re.compile(r'([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})')
+BEARER_TOKEN_PATTERN = re.compile(r'(Bearer\s+)[^\s\'",}]+', re.IGNORECASE)
+
+class LogValue:
+    """
+    Wraps a value that is passed as an argument to a logging call. The value is formatted
+    by the handler that emits the message, so no work is done for messages that are not emitted.
+    Usage: logger.debug('Sent %s', LogValue(post_data))
+    """
+
+    def __init__(self, value, max_field_bytes=LOG_MAX_FIELD_BYTES, max_bytes=LOG_MAX_VALUE_BYTES):
+        self.value = value
+        self.max_field_bytes = max_field_bytes
+        self.max_bytes = max_bytes
+
+    def __str__(self):
+        return format_log_value(self.value, self.max_field_bytes, self.max_bytes)
+
+def format_log_value(value, max_field_bytes=LOG_MAX_FIELD_BYTES, max_bytes=LOG_MAX_VALUE_BYTES) -> str:
+    """
+    Formats the value for a log message. Strings within dicts and lists are truncated to max_field_bytes,
+    the whole result to max_bytes. Email addresses and bearer tokens are redacted.
+    :param value: Value to format. Bytes are decoded as UTF-8.
+    :param max_field_bytes: int: Maximum number of bytes of a string within a dict or list
+    :param max_bytes: int: Maximum number of bytes of the result
+    :return: str: Formatted value
+    """
+    if isinstance(value, bytes):
+        # Only the part that is logged is decoded.
+        text = value[:max_bytes].decode('utf-8', errors='ignore')
+        if len(value) > max_bytes:
+            text = f'{text}... [{len(value) - max_bytes} bytes truncated]'
+        return redact(text)
+    if isinstance(value, (dict, list, tuple)):
+        value = truncate_fields(value, max_field_bytes)
+    return redact(truncate(str(value), max_bytes))
+
+def truncate_fields(value, max_field_bytes):
+    """
+    Returns a copy of the value in which all strings are truncated to max_field_bytes.
+    :param value: dict, list, tuple, str or any other value
+    :param max_field_bytes: int: Maximum number of bytes of a string
+    """
+    if isinstance(value, dict):
+        return {key: truncate_fields(field, max_field_bytes) for key, field in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [truncate_fields(field, max_field_bytes) for field in value]
+    if isinstance(value, str):
+        return truncate(value, max_field_bytes)
+    return value
+
+def truncate(text: str, max_bytes: int) -> str:
+    """
+    Truncates the text to max_bytes bytes of its UTF-8 encoding and notes how much was cut off.
+    :param text: str: Text to truncate
+    :param max_bytes: int: Maximum number of bytes
+    :return: str: Truncated text
+    """
+    # A character has at most four bytes, so shorter texts don't have to be encoded.
+    if len(text) * 4 <= max_bytes:
+        return text
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return text
+    return f'{encoded[:max_bytes].decode("utf-8", errors="ignore")}... [{len(encoded) - max_bytes} bytes truncated]'
+
+def redact(text: str) -> str:
+    """
+    Replaces email addresses by their first character and domain and removes bearer tokens.
+    :param text: str: Text to redact
+    :return: str: Redacted text
+    """
+    text = EMAIL_PATTERN.sub(r'\1***@\2', text)
+    return BEARER_TOKEN_PATTERN.sub(r'\1[redacted]', text)
@@ -12,6 +12,8 @@ from utils.logger import get_logger
 from django.core.management.base import BaseCommand
 from django.conf import settings
 
+from plugins.rqc_adapter.config import CRON_INTERVAL
+
 try:
     import crontab
 except (ImportError, ModuleNotFoundError):
@@ -24,10 +26,9 @@ class Command(BaseCommand):
     Installs the cron task for retrying failed RQC calls.
     """
 
-    help = ("Installs the cron task for retrying failed RQC calls. You can "
-            "customize when delayed calls to RQC are made."
-            "Default is '0 8 * *' which means calls are made at 8am every"
-            "day. ")
+    help = ("Installs the cron task that makes queued and failed RQC calls. You can "
+            f"customize when delayed calls to RQC are made. Default is every {CRON_INTERVAL} minutes. "
+            "With --time the calls are made once a day at the given hour.")
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -36,12 +37,20 @@ class Command(BaseCommand):
             default='install',
             help='Action to perform: install, remove, or check status of the cronjob'
         )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=CRON_INTERVAL,
+            help=f'Minutes between two runs of the RQC cronjob. Default is {CRON_INTERVAL}. '
+                 'The value should be between 1 and 59.'
+        )
         parser.add_argument(
             '--time',
             type=int,
-            default=8,
-            help='Time at which the daily RQC cronjob is run. Default is 8 for 8am.'
-                 'The value should be between 0 and 23.)'
+            default=None,
+            help='Run the RQC cronjob only once a day at this hour instead, e.g. 8 for 8am. '
+                 'Decision data then reaches RQC up to a day late unless a worker is running. '
+                 'The value should be between 0 and 23.'
         )
 
     def get_crontab(self):
@@ -68,18 +77,24 @@ class Command(BaseCommand):
                 return job
         return None
 
-    def install_rqc_cronjob(self, time=8):
+    def install_rqc_cronjob(self, time=None, interval=CRON_INTERVAL):
         """Installs RQC cronjob.
-        :param time: time of cronjob to install. Value between 0 and 23
+        :param time: Hour at which a daily cronjob is run. Value between 0 and 23. If None the cronjob
+            is run every interval minutes.
+        :param interval: Minutes between two runs of the cronjob. Value between 1 and 59
         """
         tab = self.get_crontab()
 
         if tab is None:
             return
-        if  time < 0 or time > 23:
+        if time is not None and (time < 0 or time > 23):
             self.stdout.write(self.style.ERROR('Could not install RQC cronjob. '
                                                'Please enter a time value between 0 and 23'))
             return
+        if interval < 1 or interval > 59:
+            self.stdout.write(self.style.ERROR('Could not install RQC cronjob. '
+                                               'Please enter an interval between 1 and 59'))
+            return
 
         # Get command
         virtualenv = os.environ.get('VIRTUAL_ENV', None)
@@ -94,7 +109,7 @@ class Command(BaseCommand):
         if time is not None:
             cron_job.setall(f'0 {time} * * *')
         else:
-            cron_job.setall('0 8 * * *')
+            cron_job.setall(f'*/{interval} * * * *')
         tab.write()
 
         # Write status
@@ -141,7 +156,7 @@ class Command(BaseCommand):
         """
         action = options['action']
         if action == 'install':
-            self.install_rqc_cronjob(options['time'])
+            self.install_rqc_cronjob(options['time'], options['interval'])
         elif action == 'remove':
             self.remove_rqc_cronjob()
         elif action == 'status':
@@ -2,15 +2,19 @@
 © Julius Harms, Freie Universität Berlin 2025
 """
 
-from datetime import timedelta
-from time import sleep
+import signal
+import threading
+from collections import Counter, defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
 
-from plugins.rqc_adapter.models import RQCDelayedCall, RQCJournalAPICredentials
-from plugins.rqc_adapter.rqc_calls import call_mhs_submission
-from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
-from plugins.rqc_adapter.utils import utc_now
+from plugins.rqc_adapter.config import DAEMON_POLL_INTERVAL, DELAYED_CALL_CHUNK_SIZE, \
+    DELAYED_CALL_MAX_WORKERS, DELAYED_CALL_MAX_WORKERS_PER_JOURNAL
+from plugins.rqc_adapter.dispatcher import claim_due_calls, release_calls, make_claimed_call, generate_worker_id, \
+    save_failed_attempt
+from plugins.rqc_adapter.journal_config import get_journal_config
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -24,42 +28,233 @@ class Command(BaseCommand):
     """
     Retries failed RQC Calls.
     """
-    help = "Retries failed RQC Calls."
+    help = ("Retries failed RQC Calls. With --daemon the queue is polled until the "
+            "process receives SIGTERM or SIGINT.")
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stop_event = threading.Event()
+        # Identifies the calls claimed by this worker. See dispatcher.claim_due_calls.
+        self.worker_id = generate_worker_id()
 
     def add_arguments(self, parser):
         parser.add_argument('--action', default="")
+        parser.add_argument(
+            '--daemon',
+            action='store_true',
+            help='Keep running and poll the queue of delayed calls instead of processing it once.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=DAEMON_POLL_INTERVAL,
+            help=f'Seconds between two polls of the queue in daemon mode. Default is {DAEMON_POLL_INTERVAL}.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DELAYED_CALL_MAX_WORKERS,
+            help=f'Maximum number of calls that are made at the same time. Default is {DELAYED_CALL_MAX_WORKERS}.'
+        )
+        parser.add_argument(
+            '--workers-per-journal',
+            type=int,
+            default=DELAYED_CALL_MAX_WORKERS_PER_JOURNAL,
+            help=f'Maximum number of calls for one journal that are made at the same time. '
+                 f'Default is {DELAYED_CALL_MAX_WORKERS_PER_JOURNAL}.'
+        )
+
+    def request_stop(self, signum, frame):
+        """
+        Signal handler. The call that is currently being made is finished before the command exits.
+        """
+        logger.info(f"RQC delayed call worker received signal {signum}. Shutting down after the current call.")
+        self.stop_event.set()
 
     def handle(self, *args, **options):
         """
         Retries failed RQC calls.
         :param args: None
-        :param options: None
+        :param options: daemon, interval, workers and workers_per_journal
         :return: None
         """
-        queue = RQCDelayedCall.objects.all().order_by('-last_attempt_at')
-        for call in queue:
-            if call.is_valid:
-                article = call.article
-                article_id = call.article.pk
-                journal = call.article.journal
-                post_data = fetch_post_data(article = article, journal = journal)
+        max_workers = options.get('workers')
+        if max_workers is None:
+            max_workers = DELAYED_CALL_MAX_WORKERS
+        max_workers_per_journal = options.get('workers_per_journal')
+        if max_workers_per_journal is None:
+            max_workers_per_journal = DELAYED_CALL_MAX_WORKERS_PER_JOURNAL
+        if max_workers < 1 or max_workers_per_journal < 1:
+            raise CommandError('The number of workers must be at least one.')
+
+        if not options.get('daemon'):
+            self.process_queue(max_workers, max_workers_per_journal)
+            return
+
+        interval = options.get('interval')
+        if interval is None:
+            interval = DAEMON_POLL_INTERVAL
+        if interval < 1:
+            raise CommandError('The interval must be at least one second.')
+        previous_handlers = {
+            signal.SIGTERM: signal.signal(signal.SIGTERM, self.request_stop),
+            signal.SIGINT: signal.signal(signal.SIGINT, self.request_stop),
+        }
+        logger.info(f"RQC delayed call worker started. Polling every {interval} seconds.")
+        try:
+            while not self.stop_event.is_set():
                 try:
-                    credentials = RQCJournalAPICredentials.objects.get(journal=journal)
-                except RQCJournalAPICredentials.DoesNotExist:
-                    logger.warning("Delayed call to RQC was attempted but no RQC API credentials found.")
-                    return
-                response = call_mhs_submission(credentials.rqc_journal_id, credentials.api_key, submission_id=article_id, post_data=post_data, article=article)
-                logger.info(f"Delayed call to RQC was attempted for article {article_id}:{article.title}.")
-                call.remaining_tries = call.remaining_tries - 1
-                if not response['success']:
-                    logger.info(f"Delayed call to RQC failed for article {article_id}:{article.title}.")
-                    call.last_attempt_at = utc_now()
-                    call.save()
-                    # If a call is unsuccessful we should stop trying for the day.
+                    self.process_queue(max_workers, max_workers_per_journal)
+                except Exception as e:
+                    # The worker should survive errors such as a lost database connection.
+                    logger.error(f"RQC delayed call worker failed to process the queue: {e}")
+                finally:
+                    close_old_connections()
+                self.stop_event.wait(interval)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+        logger.info("RQC delayed call worker stopped.")
+
+    def process_queue(self, max_workers=1, max_workers_per_journal=1):
+        """
+        Makes the delayed calls that are due, oldest first. Calls are claimed in chunks so that
+        workers on other nodes skip them (see dispatcher.claim_due_calls).
+        Calls are made in parallel, bounded by max_workers in total and by max_workers_per_journal
+        for each journal. If a call fails, or a journal has no API credentials, the remaining calls
+        of that journal are left for the next run while the calls of other journals continue.
+        Stops submitting calls if the worker is asked to shut down and waits for the calls in flight.
+        :param max_workers: int: Maximum number of calls made at the same time
+        :param max_workers_per_journal: int: Maximum number of calls made at the same time for one journal
+        """
+        # A single worker needs no thread pool, it runs the calls in the calling thread.
+        if max_workers == 1:
+            executor = InlineExecutor()
+            task = self.make_delayed_call
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='rqc-delayed-call')
+            task = self.make_delayed_call_in_worker_thread
+
+        credentials_by_journal = {}
+        stopped_journals = set()
+        try:
+            while not self.stop_event.is_set():
+                chunk = claim_due_calls(self.worker_id, DELAYED_CALL_CHUNK_SIZE, stopped_journals)
+                if not chunk:
                     return
-                else:
-                    logger.info(f"Delayed call to RQC succeeded for article {article_id}:{article.title}.")
-                    call.delete()
-            else:
-                call.delete()
-            sleep(1)
\ No newline at end of file
+                pending_by_journal = defaultdict(deque)
+                for call in chunk:
+                    if not call.is_valid:
+                        call.delete()
+                    else:
+                        pending_by_journal[call.article.journal_id].append(call)
+
+                for journal_id in pending_by_journal:
+                    if journal_id not in credentials_by_journal:
+                        journal_config = get_journal_config(journal_id)
+                        if journal_config.enabled:
+                            credentials_by_journal[journal_id] = journal_config
+                for journal_id in list(pending_by_journal):
+                    if journal_id not in credentials_by_journal:
+                        logger.warning(f"Delayed call to RQC was attempted but no RQC API credentials found "
+                                       f"for journal {journal_id}.")
+                        stopped_journals.add(journal_id)
+                        release_calls(self.worker_id, pending_by_journal.pop(journal_id))
+
+                stopped_journals.update(
+                    self.run_calls(executor, task, pending_by_journal, credentials_by_journal,
+                                   max_workers, max_workers_per_journal)
+                )
+                # Calls that were not made because the worker is shutting down are left to other workers.
+                release_calls(self.worker_id, [call for pending in pending_by_journal.values() for call in pending])
+        finally:
+            executor.shutdown(wait=True)
+
+    def run_calls(self, executor, task, pending_by_journal, credentials_by_journal,
+                  max_workers, max_workers_per_journal) -> set:
+        """
+        Runs the pending calls on the executor within the given limits.
+        :param executor: Executor that runs the calls
+        :param task: Function that makes one call
+        :param pending_by_journal: dict: Journal id to deque of RQCDelayedCall objects
+        :param credentials_by_journal: dict: Journal id to JournalConfig object
+        :param max_workers: int: Maximum number of calls made at the same time
+        :param max_workers_per_journal: int: Maximum number of calls made at the same time for one journal
+        :return: set: Ids of the journals with a failed call
+        """
+        failed_journals = set()
+        in_flight = {}
+        running_by_journal = Counter()
+        while True:
+            # Fill the free slots round-robin over the journals.
+            submitted = True
+            while submitted and not self.stop_event.is_set() and len(in_flight) < max_workers:
+                submitted = False
+                for journal_id, pending in pending_by_journal.items():
+                    if len(in_flight) >= max_workers:
+                        break
+                    if pending and running_by_journal[journal_id] < max_workers_per_journal:
+                        call = pending.popleft()
+                        future = executor.submit(task, call, credentials_by_journal[journal_id])
+                        in_flight[future] = (journal_id, call)
+                        running_by_journal[journal_id] += 1
+                        submitted = True
+            if not in_flight:
+                return failed_journals
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                journal_id, call = in_flight.pop(future)
+                running_by_journal[journal_id] -= 1
+                try:
+                    success = future.result()
+                except Exception as e:
+                    logger.error(f"Delayed call to RQC failed for article {call.article.pk} with an error: {e}")
+                    # The failure is saved like a failed call. Otherwise the call would be claimed first
+                    # and fail again on every run, stopping the other calls of its journal.
+                    save_failed_attempt(self.worker_id, call, f'{type(e).__name__}: {e}')
+                    success = False
+                if not success:
+                    failed_journals.add(journal_id)
+                    if pending_by_journal[journal_id]:
+                        # If a call is unsuccessful we should stop trying for this journal in this run.
+                        logger.info(f"Stopped delayed calls to RQC for journal {journal_id} for this run. "
+                                    f"{len(pending_by_journal[journal_id])} calls remain queued.")
+                        release_calls(self.worker_id, pending_by_journal[journal_id])
+                        pending_by_journal[journal_id].clear()
+
+    def make_delayed_call(self, call, credentials) -> bool:
+        """
+        Makes one delayed call. Successful calls are removed from the queue.
+        :param call: RQCDelayedCall object
+        :param credentials: JournalConfig of the article's journal
+        :return: True if the call succeeded
+        """
+        return make_claimed_call(self.worker_id, call, credentials)
+
+    def make_delayed_call_in_worker_thread(self, call, credentials) -> bool:
+        """
+        Makes one delayed call in a thread of the pool. Worker threads open their own
+        database connections which have to be closed by them.
+        """
+        try:
+            return self.make_delayed_call(call, credentials)
+        finally:
+            connections.close_all()
+
+
+class InlineExecutor:
+    """
+    Minimal executor that runs submitted functions immediately in the calling thread.
+    """
+
+    @staticmethod
+    def submit(fn, *args, **kwargs) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
@@ -1,15 +1,20 @@
 """
 © Julius Harms, Freie Universität Berlin 2025
 """
-from datetime import timezone, datetime
+import random
+from datetime import timezone, datetime, timedelta
 
 from django.db import models
+from django.utils import timezone as django_timezone
 
 from core.models import Account
 from journal.models import Journal
 from submission.models import Article
 from review.models import ReviewAssignment
 
+from plugins.rqc_adapter.config import DELAYED_CALL_MAX_TRIES, DELAYED_CALL_BACKOFF_BASE, DELAYED_CALL_BACKOFF_MAX, \
+    DELAYED_CALL_BACKOFF_JITTER, DELAYED_CALL_MAX_FAILURE_HISTORY
+
 
 class RQCReviewerOptingDecision(models.Model):
     class OptingChoices(models.IntegerChoices):
@@ -58,22 +63,56 @@ class RQCReviewerOptingDecisionForReviewAssignment(models.Model):
 class RQCCall(models.Model):
     article = models.OneToOneField(Article, null=False, blank=False, on_delete=models.CASCADE)
     editor_assignments = models.JSONField(null=False, blank=False)
+    # SHA-256 hash of the submission data last accepted by RQC and the time it was accepted.
+    # Non-interactive calls with unchanged data are skipped, see rqc_calls.call_mhs_submission.
+    last_payload_hash = models.CharField(max_length=64, null=True, blank=True)
+    last_payload_sent_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         verbose_name = "RQC Call"
         verbose_name_plural = "RQC Calls"
 
 class RQCDelayedCall(models.Model):
-    remaining_tries = models.IntegerField(default=10, null=False, blank=False)
-    article = models.ForeignKey(Article, null=False, blank=False, on_delete=models.CASCADE)
+    remaining_tries = models.IntegerField(default=DELAYED_CALL_MAX_TRIES, null=False, blank=False)
+    # There is at most one queued call per article. New failures are merged into it, see dispatcher.enqueue_submission.
+    # Installs that queued several calls per article must remove the duplicates before migrating, see README 3.1.5.
+    article = models.OneToOneField(Article, null=False, blank=False, on_delete=models.CASCADE)
     last_attempt_at = models.DateTimeField(null=True, blank=True) #TODO review!
+    # The call is made by the first run of rqc_make_delayed_calls after this time.
+    next_attempt_at = models.DateTimeField(default=django_timezone.now, null=False, blank=False, db_index=True)
     failure_reason = models.TextField(null=True, blank=True)
+    # List of {'at': ISO 8601 date, 'reason': str} for the most recent failed attempts
+    failure_history = models.JSONField(default=list, null=False, blank=True)
+    # A worker that claims the call sets these fields. Other workers skip the call until the lease expires.
+    claimed_by = models.CharField(max_length=255, null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, blank=True)
     @property
     def is_valid(self):
         if self.remaining_tries <= 0:
             return False
         return True
 
+    def record_failure(self, failure_reason):
+        """
+        Sets the failure reason and adds the failure to the failure history.
+        Only the last DELAYED_CALL_MAX_FAILURE_HISTORY failures are kept.
+        :param failure_reason: str: Reason of the failure, usually the HTTP status code or RQCErrorCode
+        """
+        self.failure_reason = failure_reason
+        failure = {'at': datetime.now(timezone.utc).isoformat(), 'reason': failure_reason}
+        self.failure_history = (list(self.failure_history or []) + [failure])[-DELAYED_CALL_MAX_FAILURE_HISTORY:]
+
+    def schedule_next_attempt(self):
+        """
+        Sets next_attempt_at after a failed attempt. The delay grows exponentially with the
+        number of attempts made and is randomly varied, so that calls that failed together
+        during an outage are not all retried at the same moment.
+        """
+        attempts = max(DELAYED_CALL_MAX_TRIES - self.remaining_tries, 1)
+        delay = min(DELAYED_CALL_BACKOFF_BASE * 2 ** (attempts - 1), DELAYED_CALL_BACKOFF_MAX)
+        delay = delay * random.uniform(1 - DELAYED_CALL_BACKOFF_JITTER, 1 + DELAYED_CALL_BACKOFF_JITTER)
+        self.next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+
     def delete_self(self):
         self.delete()
 
@@ -96,3 +135,28 @@ class RQCJournalSalt(models.Model):
     class Meta:
         verbose_name = "RQC Journal Salt"
         verbose_name_plural = "RQC Journal Salt"
+
+class RQCConfigGeneration(models.Model):
+    """
+    Counter that is incremented whenever the RQC configuration of a journal changes.
+    Processes compare it with the value they last read to drop their cached configuration, see journal_config.py.
+    There is only one row.
+    """
+    generation = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "RQC Configuration Generation"
+        verbose_name_plural = "RQC Configuration Generation"
+
+class RQCDataVersion(models.Model):
+    """
+    Version stamp of cached data, such as the submission data of an article, see payload_cache.py.
+    The stamp is replaced in the same transaction as the change of the data, so a cached entry is only
+    used if it was built from the state that is committed in the database.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    stamp = models.CharField(max_length=32)
+
+    class Meta:
+        verbose_name = "RQC Data Version"
+        verbose_name_plural = "RQC Data Versions"
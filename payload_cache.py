@@ -0,0 +1,268 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the cache for the article data that is sent to RQC in calls to the
+mhs_submission endpoint. The data of an article is cached under a version stamp of the article.
+The stamp is replaced by signal handlers whenever one of the models the data is built from
+is saved or deleted, so that the next call builds the data again.
+The entries of the review set are additionally cached one by one under a version stamp of their
+review assignment, so that only the reviews that changed have to be built again.
+The stamps are stored in the database (RQCDataVersion) and replaced in the same transaction as the
+change, so a cached entry is never used after a change was committed, even if the cache is not
+shared by all processes. Only changes in journals that use RQC replace stamps, and a deleted
+object deletes the stamps instead.
+"""
+import uuid
+
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+
+from review.models import DecisionDraft, EditorAssignment, ReviewAssignment, ReviewAssignmentAnswer, RevisionRequest
+from submission.models import Article, FrozenAuthor
+
+from plugins.rqc_adapter.config import PAYLOAD_CACHE_ALIAS, PAYLOAD_CACHE_TIMEOUT
+from plugins.rqc_adapter.journal_config import has_rqc_journals, is_rqc_enabled
+from plugins.rqc_adapter.models import RQCCall, RQCDataVersion, RQCJournalAPICredentials, \
+    RQCReviewerOptingDecisionForReviewAssignment
+from plugins.rqc_adapter.serialization import decode_json, encode_json
+
+def get_cache():
+    return caches[PAYLOAD_CACHE_ALIAS]
+
+def version_key(article_id) -> str:
+    return f'payload:{article_id}'
+
+def payload_key(article_id, version) -> str:
+    return f'rqc_adapter:payload:{article_id}:{version}'
+
+def review_version_key(review_assignment_id) -> str:
+    return f'review:{review_assignment_id}'
+
+def review_key(review_assignment_id, version) -> str:
+    return f'rqc_adapter:review:{review_assignment_id}:{version}'
+
+def get_versions(keys) -> dict:
+    """
+    Returns the version stamps under the given keys in one query. New stamps are created for keys that have none.
+    :param keys: Keys of the version stamps
+    :return: dict: Key to version stamp
+    """
+    versions = dict(RQCDataVersion.objects.filter(key__in=keys).values_list('key', 'stamp'))
+    for key in keys:
+        if key not in versions:
+            # Another process may create a stamp at the same time. get_or_create keeps the first one.
+            data_version, _ = RQCDataVersion.objects.get_or_create(key=key, defaults={'stamp': uuid.uuid4().hex})
+            versions[key] = data_version.stamp
+    return versions
+
+def get_version(key) -> str:
+    """
+    Returns the version stamp under the given key. A new stamp is created if there is none.
+    :param key: str: Key of the version stamp
+    :return: str: Version stamp
+    """
+    return get_versions([key])[key]
+
+def get_payload_version(article_id) -> str:
+    """
+    Returns the current version stamp of the article's data. A new stamp is created if there is none.
+    :param article_id: Primary key of the article
+    :return: str: Version stamp
+    """
+    return get_version(version_key(article_id))
+
+def bump_version(key):
+    """
+    Replaces the version stamp under the given key so that data cached under the old stamp is no longer used.
+    Other processes see the new stamp when the current transaction is committed, together with the change.
+    :param key: str: Key of the version stamp
+    """
+    stamp = uuid.uuid4().hex
+    if not RQCDataVersion.objects.filter(key=key).update(stamp=stamp):
+        _, created = RQCDataVersion.objects.get_or_create(key=key, defaults={'stamp': stamp})
+        if not created:
+            # Another process created the stamp in the meantime, possibly from the state before the change.
+            RQCDataVersion.objects.filter(key=key).update(stamp=stamp)
+
+def bump_payload_version(article_id):
+    """
+    Replaces the version stamp of the article. See bump_version.
+    :param article_id: Primary key of the article
+    """
+    bump_version(version_key(article_id))
+
+def bump_review_version(review_assignment_id):
+    """
+    Replaces the version stamp of the review assignment. See bump_version.
+    :param review_assignment_id: Primary key of the review assignment
+    """
+    bump_version(review_version_key(review_assignment_id))
+
+def get_cached_payload(article_id, version) -> dict | None:
+    """
+    :param article_id: Primary key of the article
+    :param version: str: Version stamp returned by get_payload_version
+    :return: dict: Cached article data or None if there is none for this version
+    """
+    if version is None:
+        return None
+    serialized = get_cache().get(payload_key(article_id, version))
+    if serialized is None:
+        return None
+    return decode_json(serialized)
+
+def set_cached_payload(article_id, version, payload):
+    """
+    Caches the article data under the given version stamp.
+    :param article_id: Primary key of the article
+    :param version: str: Version stamp returned by get_payload_version before the data was loaded
+    :param payload: dict: Article data
+    """
+    if version is None:
+        return
+    get_cache().set(payload_key(article_id, version), encode_json(payload), PAYLOAD_CACHE_TIMEOUT)
+
+def invalidate_review_assignment(review_assignment):
+    """
+    Replaces the version stamps of the review assignment and its article. Needed after
+    bulk updates of the models the data is built from, which don't send signals.
+    :param review_assignment: ReviewAssignment object
+    """
+    bump_review_version(review_assignment.pk)
+    bump_payload_version(review_assignment.article_id)
+
+def get_review_versions(article_id, review_assignment_ids) -> tuple:
+    """
+    Returns the current version stamps of the article and its review assignments in one query.
+    New stamps are created if there are none.
+    :param article_id: Primary key of the article
+    :param review_assignment_ids: Primary keys of the review assignments
+    :return: tuple: Version stamp of the article and dict of review assignment id to version stamp
+    """
+    keys = {review_version_key(review_assignment_id): review_assignment_id
+            for review_assignment_id in review_assignment_ids}
+    versions = get_versions([version_key(article_id), *keys])
+    return versions[version_key(article_id)], {keys[key]: versions[key] for key in keys}
+
+def get_cached_reviews(versions) -> dict:
+    """
+    :param versions: dict: Review assignment id to version stamp returned by get_review_versions
+    :return: dict: Review assignment id to cached review entry for the review assignments that have one
+    """
+    keys = {review_key(review_assignment_id, version): review_assignment_id
+            for review_assignment_id, version in versions.items()}
+    if not keys:
+        return {}
+    return {keys[key]: decode_json(serialized) for key, serialized in get_cache().get_many(keys).items()}
+
+def set_cached_reviews(reviews, versions):
+    """
+    Caches the review entries under the version stamps of their review assignments.
+    :param reviews: dict: Review assignment id to review entry
+    :param versions: dict: Review assignment id to version stamp returned by get_review_versions
+        before the review assignments were loaded
+    """
+    serialized_reviews = {
+        review_key(review_assignment_id, versions[review_assignment_id]): encode_json(review)
+        for review_assignment_id, review in reviews.items() if versions.get(review_assignment_id) is not None
+    }
+    if serialized_reviews:
+        get_cache().set_many(serialized_reviews, PAYLOAD_CACHE_TIMEOUT)
+
+
+# Changes are only tracked for journals that use RQC. The sender of each signal is mapped to a
+# function that returns the ids of the affected articles together with the ids of their journals.
+def articles_of(instance):
+    """
+    :param instance: Object with a foreign key to an article
+    :return: (article id, journal id) of the article. No query is made if the article is already loaded.
+    """
+    if instance.article_id is None:
+        return []
+    if type(instance).article.is_cached(instance):
+        return [(instance.article_id, instance.article.journal_id)]
+    return Article.objects.filter(pk=instance.article_id).values_list('pk', 'journal_id')
+
+def articles_of_review_assignment(instance, field_name):
+    """
+    :param instance: Object with a foreign key to a review assignment
+    :param field_name: str: Name of the foreign key
+    :return: (article id, journal id) of the review assignment's article
+    """
+    if getattr(instance, f'{field_name}_id') is None:
+        return []
+    if getattr(type(instance), field_name).is_cached(instance):
+        return articles_of(getattr(instance, field_name))
+    return ReviewAssignment.objects.filter(pk=getattr(instance, f'{field_name}_id')) \
+        .values_list('article_id', 'article__journal_id')
+
+ARTICLES_BY_SENDER = {
+    Article: lambda instance: [(instance.pk, instance.journal_id)],
+    ReviewAssignment: articles_of,
+    ReviewAssignmentAnswer: lambda instance: articles_of_review_assignment(instance, 'assignment'),
+    EditorAssignment: articles_of,
+    DecisionDraft: articles_of,
+    RevisionRequest: articles_of,
+    FrozenAuthor: articles_of,
+    RQCCall: articles_of,
+    RQCReviewerOptingDecisionForReviewAssignment:
+        lambda instance: articles_of_review_assignment(instance, 'review_assignment'),
+}
+
+# The sender of each signal that changes a review entry mapped to a function that returns the id of its review assignment.
+REVIEW_ASSIGNMENT_ID_BY_SENDER = {
+    ReviewAssignment: lambda instance: instance.pk,
+    ReviewAssignmentAnswer: lambda instance: instance.assignment_id,
+    RQCReviewerOptingDecisionForReviewAssignment: lambda instance: instance.review_assignment_id,
+}
+
+def affected_version_keys(sender, instance) -> list:
+    """
+    :param sender: Model class of the saved or deleted object
+    :param instance: Saved or deleted object
+    :return: list: Keys of the version stamps of the affected articles and review assignments whose journal uses RQC
+    """
+    # Presses without any RQC journal don't need a query to find out.
+    if not has_rqc_journals():
+        return []
+    keys = [version_key(article_id) for article_id, journal_id in ARTICLES_BY_SENDER[sender](instance)
+            if article_id is not None and is_rqc_enabled(journal_id)]
+    if keys and sender in REVIEW_ASSIGNMENT_ID_BY_SENDER:
+        review_assignment_id = REVIEW_ASSIGNMENT_ID_BY_SENDER[sender](instance)
+        if review_assignment_id is not None:
+            keys.append(review_version_key(review_assignment_id))
+    return keys
+
+def invalidate_payload(sender, instance, raw=False, **kwargs):
+    """
+    Signal handler that replaces the version stamps of the articles and review assignments
+    affected by a saved object. Objects saved by loaddata are skipped.
+    """
+    if raw:
+        return
+    for key in affected_version_keys(sender, instance):
+        bump_version(key)
+
+def drop_payload_versions(sender, instance, **kwargs):
+    """
+    Signal handler that deletes the version stamps of the articles and review assignments affected
+    by a deleted object. A new stamp is created when the data is loaded again, so entries cached under
+    the old stamp are no longer used. No stamps are created for objects that don't exist anymore.
+    """
+    keys = affected_version_keys(sender, instance)
+    if keys:
+        RQCDataVersion.objects.filter(key__in=keys).delete()
+
+def drop_all_versions(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Signal handler for saved credentials. Changes are not tracked while a journal doesn't use RQC,
+    so when a journal starts to use RQC all version stamps are deleted and no cached entry is used again.
+    """
+    if created and not raw:
+        RQCDataVersion.objects.all().delete()
+
+for model in ARTICLES_BY_SENDER:
+    post_save.connect(invalidate_payload, sender=model, dispatch_uid=f'rqc_adapter_payload_save_{model.__name__}')
+    post_delete.connect(drop_payload_versions, sender=model,
+                        dispatch_uid=f'rqc_adapter_payload_delete_{model.__name__}')
+post_save.connect(drop_all_versions, sender=RQCJournalAPICredentials, dispatch_uid='rqc_adapter_payload_credentials')
@@ -2,6 +2,10 @@
 © Julius Harms, Freie Universität Berlin 2025
 """
 from plugins.rqc_adapter.events import create_review_assignment_opting_decision, implicit_call_mhs_submission
+from plugins.rqc_adapter.journal_config import preload_journal_configs
+# Connects the signal handlers that invalidate the cached grading action in every process,
+# including those that never render the hooks.
+from plugins.rqc_adapter import grading_action_cache  # noqa: F401
 from utils import plugins
 from utils.logger import get_logger
 from events import logic as events_logic
@@ -39,6 +43,9 @@ def install():
 
 def hook_registry():
     Rqc_adapterPlugin.hook_registry()
+    # The hooks are registered when Janeway starts. The journals that use RQC are loaded
+    # now so that rendering the hooks needs no query for journals without RQC.
+    preload_journal_configs()
     return {
         'in_review_editor_actions': {
                     'module': 'plugins.rqc_adapter.hooks',
@@ -0,0 +1,80 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file builds the headers of calls to the RQC API. The headers that are the same for every call,
+including the Janeway version, are built once per process. Only the time of the call and the
+API key are added per call. The Janeway version is loaded again if a Version is saved or deleted,
+otherwise a new version is picked up when the server is restarted after the upgrade.
+"""
+import threading
+
+from django.db.models.signals import post_delete, post_save
+
+from utils.models import Version
+
+from plugins.rqc_adapter.config import API_VERSION, VERSION
+from plugins.rqc_adapter.utils import convert_date_to_rqc_format
+
+ADAPTER_HEADER = f'RQC plugin {VERSION} https://github.com/JuliusHarms/janeway-rqcplugin'
+
+_static_headers = None
+_static_headers_lock = threading.Lock()
+
+def get_janeway_version() -> str:
+    """
+    :return: str: Number of the installed Janeway version
+    :raises ValueError: if the version can't be determined
+    """
+    try:
+        current_version = Version.objects.all().order_by('-number').first()
+    except Exception as db_error:
+        raise ValueError(f"Error retrieving version information: {db_error}")
+    if not current_version:
+        raise ValueError('Error retrieving version information: No version information available')
+    return current_version.number
+
+def get_static_headers() -> dict:
+    """
+    Returns the headers that are the same for every call. They are built on first use.
+    :return: dict: Headers. Must not be modified.
+    :raises ValueError: if the Janeway version can't be determined
+    """
+    global _static_headers
+    if _static_headers is None:
+        with _static_headers_lock:
+            if _static_headers is None:
+                _static_headers = {
+                    'X-Rqc-Api-Version': API_VERSION,
+                    'X-Rqc-Mhs-Version': f'Janeway {get_janeway_version()}',
+                    'X-Rqc-Mhs-Adapter': ADAPTER_HEADER,
+                }
+    return _static_headers
+
+def build_headers(api_key: str, use_post=False) -> dict:
+    """
+    Returns the headers of a call to the RQC API.
+    :param api_key: str: API key of the journal
+    :param use_post: bool: Whether the call posts JSON data
+    :return: dict: Headers
+    :raises ValueError: if the Janeway version can't be determined
+    """
+    headers = {
+        **get_static_headers(),
+        'X-Rqc-Time': convert_date_to_rqc_format(),
+        'Authorization': f'Bearer {api_key}',
+    }
+    if use_post:
+        headers['Content-Type'] = 'application/json'
+    return headers
+
+def reset_static_headers(**kwargs):
+    """
+    Drops the headers that are the same for every call so that they are built again on the next call.
+    Connected to the signals of Version.
+    """
+    global _static_headers
+    with _static_headers_lock:
+        _static_headers = None
+
+post_save.connect(reset_static_headers, sender=Version, dispatch_uid='rqc_adapter_headers_version_save')
+post_delete.connect(reset_static_headers, sender=Version, dispatch_uid='rqc_adapter_headers_version_delete')
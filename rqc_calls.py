@@ -6,27 +6,98 @@ Exceptions while calling the API get handled here and passed down via the result
 in the call_rqc_api function.
 """
 
+import gzip
+import hashlib
 import json
-from enum import IntEnum
+import random
+import time
+from enum import Enum, IntEnum
 
 import requests
 from requests import RequestException
 
 from utils.logger import get_logger
-from utils.models import Version
 
+from plugins.rqc_adapter.circuit_breaker import get_circuit_breaker
+from plugins.rqc_adapter.http_session import get_session
+from plugins.rqc_adapter.log_formatting import LogValue
 from plugins.rqc_adapter.models import RQCCall, RQCReviewerOptingDecisionForReviewAssignment
-from plugins.rqc_adapter.utils import convert_date_to_rqc_format
-from plugins.rqc_adapter.config import API_VERSION, API_BASE_URL, REQUEST_TIMEOUT
-from plugins.rqc_adapter.config import VERSION
+from plugins.rqc_adapter.request_headers import build_headers
+from plugins.rqc_adapter.serialization import encode_json
+from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
+from plugins.rqc_adapter.utils import utc_now
+from plugins.rqc_adapter.config import API_BASE_URL, REQUEST_TIMEOUTS, REQUEST_COMPRESSION_ENABLED, \
+    REQUEST_COMPRESSION_MIN_BYTES, REQUEST_COMPRESSION_LEVEL, FAST_RETRY_MAX_ATTEMPTS, FAST_RETRY_STATUS_CODES, \
+    FAST_RETRY_BACKOFF_BASE, FAST_RETRY_BACKOFF_MAX, FAST_RETRY_BACKOFF_JITTER, FAST_RETRY_MIN_REMAINING
 
 logger = get_logger(__name__)
 
+# Set if RQC rejected a compressed request body, see post_body.
+_compression_rejected = False
+# Parts of the body of a 400 response that show that a compressed request body could not be decoded
+COMPRESSION_REJECTION_HINTS = ('gzip', 'content-encoding', 'decod', 'codec')
+
 class RQCErrorCodes(IntEnum):
     CONNECTION_ERROR = -1
     TIMEOUT = -2
     REQUEST_ERROR = -3
     UNKNOWN_ERROR = -4
+    # The call was not made because RQC was unavailable for the previous calls, see circuit_breaker.py
+    CIRCUIT_OPEN = -5
+
+# Fields of the submission data that are only set for interactive calls, see encode_submission_data
+INTERACTIVE_FIELDS = ('interactive_user', 'mhs_submissionpage')
+
+class RQCCallContext(Enum):
+    """
+    The situation in which a call is made. Each has its own timeouts, see REQUEST_TIMEOUTS in config.py.
+    """
+    INTERACTIVE = 'interactive' # An editor clicked the grading button and waits for the response
+    APIKEYCHECK = 'apikeycheck' # The credentials are checked when the settings form is saved
+    IMPLICIT = 'implicit' # A queued call is made by the in-process dispatcher in the web process
+    BACKGROUND = 'background' # A queued call is made by the rqc_make_delayed_calls command
+
+class Deadline:
+    """
+    Time budget of a call to the RQC API. All requests made for the call, e.g. a second request
+    after a rejected compressed body, have to finish before the deadline.
+    """
+
+    def __init__(self, connect_timeout, read_timeout, budget):
+        """
+        :param connect_timeout: float: Seconds to wait for a connection
+        :param read_timeout: float: Seconds to wait for data from the server
+        :param budget: float: Seconds the whole call may take
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.expires_at = time.monotonic() + budget
+
+    @classmethod
+    def for_context(cls, context):
+        """
+        :param context: RQCCallContext
+        :return: Deadline with the timeouts configured for the context
+        """
+        timeouts = REQUEST_TIMEOUTS[context.value]
+        return cls(timeouts['connect'], timeouts['read'], timeouts['deadline'])
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def request_timeout(self) -> tuple:
+        """
+        :return: tuple (connect timeout, read timeout) for the next request, shortened to the remaining time
+        :raises requests.Timeout: if the deadline has passed
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise requests.Timeout('The deadline of the call to RQC has passed.')
+        return min(self.connect_timeout, remaining), min(self.read_timeout, remaining)
+
+# Results with these status codes mean that RQC is unavailable. They are counted by the circuit breaker.
+# A 500 is left out because it can be caused by the data of a single submission.
+UNAVAILABLE_STATUS_CODES = (RQCErrorCodes.CONNECTION_ERROR, RQCErrorCodes.TIMEOUT, 502, 503, 504)
 
 def call_mhs_apikeycheck(journal_id: int, api_key: str) -> dict:
     """
@@ -36,34 +107,227 @@ def call_mhs_apikeycheck(journal_id: int, api_key: str) -> dict:
     :return:int: dict: Response data dictionary. See call_rqc_api for details.
     """
     url = f'{API_BASE_URL}/mhs_apikeycheck/{journal_id}'
-    return call_rqc_api(url, api_key)
+    return call_rqc_api(url, api_key, context=RQCCallContext.APIKEYCHECK)
 
-def call_mhs_submission(journal_id: int, api_key: str, submission_id, post_data: str, article=None) -> dict:
+def call_mhs_submission(journal_id: int, api_key: str, submission_id, post_data: str, article=None,
+                        context=RQCCallContext.BACKGROUND) -> dict:
     """
     Calls the mhs_submission endpoint of the RQC API.
+    Non-interactive calls are skipped if RQC already accepted the same submission data for the article,
+    built without the payload cache. In that case the result is successful and http_status_code is None.
+    Errors while the call is prepared are returned with RQCErrorCodes.UNKNOWN_ERROR like errors of the request.
     :param journal_id: str: The journal Id as issued by RQC
     :param api_key: str: The API key to validate
     :param submission_id: str: id of the submission (article)
     :param post_data: str: data to send in the request
     :param article: Article object
+    :param context: RQCCallContext: Determines the timeouts of the call
     :return: dict: Response data dictionary. See call_rqc_api for details.
     """
     url = f'{API_BASE_URL}/mhs_submission/{journal_id}/{submission_id}'
-    return call_rqc_api(url , api_key, use_post=True, post_data=post_data, article=article)
+    try:
+        body, payload_hash = encode_submission_data(post_data)
+        # Interactive calls open RQC for the user, so they are always made.
+        if article is not None and not post_data.get('interactive_user') and \
+                is_submission_data_unchanged(article, payload_hash):
+            # post_data may come from the payload cache. The call is only skipped if the data
+            # built without the cache is unchanged as well.
+            post_data = fetch_post_data(article, article.journal, use_cache=False)
+            body, payload_hash = encode_submission_data(post_data)
+            if is_submission_data_unchanged(article, payload_hash):
+                logger.info(f'Submission data of article {article.pk} is unchanged since the last call to RQC. '
+                            f'The call was skipped.')
+                return {
+                    'success': True,
+                    'http_status_code': None,
+                    'message': 'The submission data is unchanged since the last call. The call was skipped.',
+                    'redirect_target': None,
+                }
+    except Exception as e:
+        result = {
+            'success': False,
+            'http_status_code': RQCErrorCodes.UNKNOWN_ERROR,
+            'message': f'Unexpected error: {str(e)}',
+            'redirect_target': None,
+        }
+        log_call_result(result)
+        return result
+    result = call_rqc_api(url , api_key, use_post=True, post_data=post_data, article=article, body=body,
+                          compress=REQUEST_COMPRESSION_ENABLED, context=context)
+    if result['success'] and article is not None:
+        # A bulk update is used because saving the call record would invalidate the cached
+        # submission data of the article (see payload_cache.py), which did not change.
+        RQCCall.objects.filter(article=article).update(last_payload_hash=payload_hash,
+                                                       last_payload_sent_at=utc_now())
+    return result
+
+def is_submission_data_unchanged(article, payload_hash: str) -> bool:
+    """
+    :param article: Article object
+    :param payload_hash: str: Hash of the submission data, see encode_submission_data
+    :return: True if RQC already accepted submission data with this hash for the article
+    """
+    return RQCCall.objects.filter(article=article, last_payload_hash=payload_hash).exists()
+
+def encode_submission_data(post_data: dict) -> tuple:
+    """
+    Encodes the submission data for the request and hashes it. The data without INTERACTIVE_FIELDS is
+    encoded once and hashed, so that the data of an interactive call has the same hash as the data of a
+    non-interactive call for the same state of the article. The interactive fields are encoded on their
+    own and put in front of the other fields.
+    :param post_data: dict: Submission data, see submission_data_retrieval.fetch_post_data
+    :return: tuple: bytes: Request body and str: SHA-256 hex digest of the data without the interactive fields
+    """
+    article_data = {key: value for key, value in post_data.items() if key not in INTERACTIVE_FIELDS}
+    interactive_data = {key: post_data[key] for key in INTERACTIVE_FIELDS if key in post_data}
+    hashed_body = encode_json(article_data)
+    payload_hash = hashlib.sha256(hashed_body).hexdigest()
+    if not interactive_data:
+        return hashed_body, payload_hash
+    if not article_data:
+        return encode_json(interactive_data), payload_hash
+    # Both are encoded as JSON objects, which are joined into one object.
+    return encode_json(interactive_data)[:-1] + b',' + hashed_body[1:], payload_hash
+
+def hash_submission_data(post_data: dict) -> str:
+    """
+    :param post_data: dict: Submission data, see submission_data_retrieval.fetch_post_data
+    :return: str: Hash of the submission data, see encode_submission_data
+    """
+    return encode_submission_data(post_data)[1]
 
 def log_call_result(result: dict):
     if result['success']:
-        logger.info(f'RQC API call succeeded. More information: {result}')
+        logger.info('RQC API call succeeded. More information: %s', LogValue(result))
     else:
-        logger.info(f'RQC API call failed. More information: {result}')
+        logger.info('RQC API call failed. More information: %s', LogValue(result))
 
-def call_rqc_api(url: str, api_key: str, use_post=False, post_data=None, article=None) -> dict:
+def post_body(session, url, body, headers, compress=False, deadline=None):
+    """
+    Posts the body. If compress is set and the body has at least REQUEST_COMPRESSION_MIN_BYTES bytes
+    it is sent gzip-compressed. If the server rejects the compressed body it is sent again uncompressed,
+    and if that succeeds compression is not used again by this process.
+    :param session: requests.Session
+    :param url: str: URL to call
+    :param body: bytes: Request body
+    :param headers: dict: Request headers
+    :param compress: bool: Whether to compress large bodies
+    :param deadline: Deadline of the call. The timeouts of the background context are used if None.
+    :return: requests.Response
+    """
+    global _compression_rejected
+    if deadline is None:
+        deadline = Deadline.for_context(RQCCallContext.BACKGROUND)
+    def post(data, request_headers):
+        return session.post(
+            url,
+            data = data,
+            headers = request_headers,
+            timeout = deadline.request_timeout(),
+            allow_redirects = False,
+        )
+
+    if not compress or _compression_rejected or len(body) < REQUEST_COMPRESSION_MIN_BYTES:
+        return post(body, headers)
+    compressed_body = gzip.compress(body, compresslevel=REQUEST_COMPRESSION_LEVEL)
+    response = post(compressed_body, {**headers, 'Content-Encoding': 'gzip'})
+    if not is_compression_rejection(response):
+        return response
+    logger.info(f'RQC rejected the compressed request body with status code {response.status_code}. '
+                f'Sending it uncompressed.')
+    response = post(body, headers)
+    if response.status_code not in (400, 415):
+        logger.warning('RQC does not accept compressed request bodies. Compression is disabled for this process.')
+        _compression_rejected = True
+    return response
+
+def is_compression_rejection(response) -> bool:
+    """
+    A server that can't decode a compressed body answers with 415 or with a 400 that reports the
+    decoding failure. Other 400 responses report invalid submission data and are returned as they are.
+    :param response: requests.Response to a compressed request body
+    :return: True if the server rejected the compression
+    """
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    text = response.text.lower() if isinstance(response.text, str) else ''
+    return any(hint in text for hint in COMPRESSION_REJECTION_HINTS)
+
+def send_with_retries(send, deadline):
+    """
+    Makes a request and repeats it after a short wait if it failed with one of FAST_RETRY_STATUS_CODES
+    or because the connection was reset. At most FAST_RETRY_MAX_ATTEMPTS requests are made and a retry
+    is only made if it fits into the deadline. Repeating is safe because every call to RQC sends
+    the complete state and RQC treats a repeated call like the first one.
+    Timeouts are not retried, they already used up a large part of the deadline.
+    :param send: Function without parameters that makes the request and returns the requests.Response
+    :param deadline: Deadline of the call
+    :return: requests.Response of the last request
+    :raises requests.RequestException: if the last request raised one
+    """
+    attempt = 1
+    while True:
+        try:
+            response = send()
+            if response.status_code not in FAST_RETRY_STATUS_CODES:
+                return response
+            failure = f'status code {response.status_code}'
+        except requests.ConnectionError as e:
+            # ConnectTimeout is both a ConnectionError and a Timeout.
+            if isinstance(e, requests.Timeout):
+                raise
+            response = None
+            error = e
+            failure = 'connection error'
+        delay = min(FAST_RETRY_BACKOFF_BASE * 2 ** (attempt - 1), FAST_RETRY_BACKOFF_MAX)
+        delay = delay * random.uniform(1 - FAST_RETRY_BACKOFF_JITTER, 1 + FAST_RETRY_BACKOFF_JITTER)
+        if attempt >= FAST_RETRY_MAX_ATTEMPTS or deadline.remaining() < delay + FAST_RETRY_MIN_REMAINING:
+            if response is None:
+                raise error
+            return response
+        logger.info(f'Request to RQC failed with {failure}. Retrying in {delay:.2f} seconds.')
+        time.sleep(delay)
+        attempt += 1
+
+def call_rqc_api(url: str, api_key: str, use_post=False, post_data=None, article=None, body=None,
+                 compress=False, context=RQCCallContext.BACKGROUND) -> dict:
+    """Calls the RQC API unless the circuit breaker is open. In that case the call fails
+    immediately with RQCErrorCodes.CIRCUIT_OPEN. See request_rqc_api for the parameters and the result.
+    :param context: RQCCallContext: Determines the timeouts and the deadline of the call"""
+    circuit_breaker = get_circuit_breaker()
+    breaker_state = circuit_breaker.acquire() if circuit_breaker is not None else None
+    if circuit_breaker is not None and breaker_state is None:
+        result = {
+            'success': False,
+            'http_status_code': RQCErrorCodes.CIRCUIT_OPEN,
+            'message': 'RQC is currently unavailable. Please try again later.',
+            'redirect_target': None,
+        }
+        log_call_result(result)
+        return result
+    result = request_rqc_api(url, api_key, use_post, post_data, article, body, compress,
+                             Deadline.for_context(context))
+    if circuit_breaker is not None:
+        probe = breaker_state == circuit_breaker.HALF_OPEN
+        if result['http_status_code'] in UNAVAILABLE_STATUS_CODES:
+            circuit_breaker.record_failure(probe)
+        else:
+            circuit_breaker.record_success(probe)
+    return result
+
+def request_rqc_api(url: str, api_key: str, use_post=False, post_data=None, article=None, body=None,
+                    compress=False, deadline=None) -> dict:
     """Calls the RQC API. Calling endpoint depends on use_post.
     :param url: str: URL to call
     :param api_key: str: API key
     :param use_post: bool: Whether to use post request or not
     :param post_data: str: Post data
     :param article: str: Article object
+    :param body: bytes: post_data encoded by encode_json. Encoded here if None.
+    :param compress: bool: Whether to gzip bodies of at least REQUEST_COMPRESSION_MIN_BYTES bytes
+    :param deadline: Deadline of the call. The timeouts of the background context are used if None.
     :return: dict: Response data and error message dictionary."""
     result = {
         'success': False, # Boolean if satus code is 200 or 303. Because RQC responds with 303
@@ -74,37 +338,24 @@ def call_rqc_api(url: str, api_key: str, use_post=False, post_data=None, article
         # that can help users.
         'redirect_target': None, #Set if the RQC response contains a redirect target. None otherwise.
     }
+    if deadline is None:
+        deadline = Deadline.for_context(RQCCallContext.BACKGROUND)
     try:
-        try:
-            current_version = Version.objects.all().order_by('-number').first()
-            if not current_version:
-                raise ValueError('No version information available')
-        except Exception as db_error:
-            raise ValueError(f"Error retrieving version information: {db_error}")
-
-        headers = {
-            'X-Rqc-Api-Version': API_VERSION,
-            'X-Rqc-Mhs-Version': f'Janeway {current_version.number}',
-            'X-Rqc-Mhs-Adapter': f'RQC plugin {VERSION} https://github.com/JuliusHarms/janeway-rqcplugin',
-            'X-Rqc-Time': convert_date_to_rqc_format(),
-            'Authorization': f'Bearer {api_key}',
-        }
-        logger.debug("POST data to RQC %s:\n%s", url, json.dumps(post_data, indent=2, ensure_ascii=False))
+        headers = build_headers(api_key, use_post)
+        session = get_session()
         if use_post:
-            headers['Content-Type'] = 'application/json'
-            response = requests.post(
-                url,
-                json = post_data,
-                headers = headers,
-                timeout = REQUEST_TIMEOUT,
-                allow_redirects = False,
-            )
+            if body is None:
+                body = encode_json(post_data)
+            logger.debug("POST data to RQC %s (%d bytes):\n%s", url, len(body), LogValue(body))
+            response = send_with_retries(
+                lambda: post_body(session, url, body, headers, compress, deadline), deadline)
         else:
-            response = requests.get(
-                url,
-                headers = headers,
-                timeout = REQUEST_TIMEOUT
-            )
+            response = send_with_retries(
+                lambda: session.get(
+                    url,
+                    headers = headers,
+                    timeout = deadline.request_timeout()
+                ), deadline)
         result['http_status_code'] = response.status_code
         result['success'] = response.ok
 
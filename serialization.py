@@ -0,0 +1,32 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains the JSON encoding of the data sent to RQC. Data is encoded once to compact
+UTF-8 bytes which are then used for sending, hashing and logging.
+orjson is used if it is installed, otherwise the json module of the standard library.
+"""
+import json
+
+try:
+    import orjson
+except (ImportError, ModuleNotFoundError):
+    orjson = None
+
+def encode_json(data) -> bytes:
+    """
+    Encodes the data as compact JSON with sorted keys. Equal data always results in equal bytes.
+    :param data: JSON serializable data
+    :return: bytes: UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def decode_json(encoded):
+    """
+    :param encoded: bytes or str: JSON
+    :return: Decoded data
+    """
+    if orjson is not None:
+        return orjson.loads(encoded)
+    return json.loads(encoded)
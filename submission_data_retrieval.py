@@ -5,25 +5,156 @@ This file contains the fetch_post_data function that handles the task of retriev
 is sent to RQC in calls to the mhs_submission API endpoint.
 """
 import logging
+from collections import defaultdict
+from dataclasses import dataclass
 
-from django.db.models import Q
+from django.db.models import JSONField, OuterRef, Q, Subquery
 
+from core.models import Account
+from journal.models import Journal
+from review.models import ReviewAssignmentAnswer, RevisionRequest
+from submission.models import Article, FrozenAuthor
+
+from plugins.rqc_adapter.journal_config import get_journal_config
+from plugins.rqc_adapter.log_formatting import LogValue
 from plugins.rqc_adapter.models import RQCReviewerOptingDecision, RQCReviewerOptingDecisionForReviewAssignment, \
     RQCJournalSalt, RQCCall
+from plugins.rqc_adapter.payload_cache import get_cached_payload, get_cached_reviews, get_payload_version, \
+    get_review_versions, set_cached_payload, set_cached_reviews
 from plugins.rqc_adapter.utils import convert_review_decision_to_rqc_format, create_pseudo_address, encode_file_as_b64, \
-    get_editorial_decision, generate_random_salt, convert_date_to_rqc_format
+    convert_editorial_decision_to_rqc_format, generate_random_salt, convert_date_to_rqc_format
 
 MAX_SINGLE_LINE_STRING_LENGTH = 2000
 MAX_MULTI_LINE_STRING_LENGTH = 200000
 MAX_LIST_LENGTH = 20
 
-def fetch_post_data(article, journal, mhs_submissionpage = '', is_interactive = False, user = None ):
+# Account fields that are transmitted for editors. Only these are loaded from the database.
+EDITOR_FIELDS = ('email', 'first_name', 'last_name', 'orcid')
+
+@dataclass(frozen=True)
+class ArticleContext:
+    """
+    Snapshot of all data of an article that is needed to build the submission data.
+    Created by load_article_context. The get_*_info functions only read from it and don't query the database.
+    """
+    article: Article
+    journal: Journal
+    correspondence_author: Account
+    # Order of the correspondence author in the frozen authors. None if there is no frozen author record.
+    correspondence_author_order: int | None
+    decision: str
+    # Editor list of a previous successful call to RQC. None if no call was made yet.
+    sent_editor_assignments: list | None
+    editor_assignments: tuple
+    decision_drafts: tuple
+    review_assignments: tuple
+    # Version stamp of the article after the review assignments were loaded, see payload_cache.py
+    payload_version: str
+    # Review assignment id to version stamp and to cached review entry
+    review_versions: dict
+    cached_reviews: dict
+    # Review assignment id to list of answers. Only loaded for review assignments without a cached review entry.
+    review_form_answers: dict
+    # Salt of the journal. None if the journal has none yet.
+    journal_salt: str | None
+
+def load_article_context(article, journal, use_cache=True) -> ArticleContext:
+    """ Loads everything that is needed to build the submission data for the article.
+    The number of queries is fixed: the article is loaded with its correspondence author, the latest
+    revision request, the order of the frozen author, a previous RQC call and the journal salt in one query.
+    The editor assignments, decision drafts, review assignments, the version stamps and the review form answers
+    take one query each.
+    The editors are not loaded if RQC already knows them from a previous call and the answers are only
+    loaded for reviews that are not cached.
+    :param article: Article object
+    :param journal: Journal object
+    :param use_cache: Boolean flag. If False no cached review entries are used.
+    :return: ArticleContext
+    """
+    latest_revision_type = RevisionRequest.objects.filter(
+        article=OuterRef('pk')
+    ).order_by('-date_requested').values('type')[:1]
+    # The frozen author is chosen like QuerySet.first() does: by the default ordering of the model, or by pk.
+    frozen_authors = FrozenAuthor.objects.filter(article=OuterRef('pk'), author=OuterRef('correspondence_author'))
+    if not frozen_authors.ordered:
+        frozen_authors = frozen_authors.order_by('pk')
+    correspondence_author_order = frozen_authors.values('order')[:1]
+    sent_editor_assignments = RQCCall.objects.filter(article=OuterRef('pk')).values('editor_assignments')[:1]
+    journal_salt = RQCJournalSalt.objects.filter(journal=OuterRef('journal')).values('salt')[:1]
+    loaded_article = Article.objects.select_related('correspondence_author').annotate(
+        rqc_latest_revision_type=Subquery(latest_revision_type),
+        rqc_correspondence_author_order=Subquery(correspondence_author_order),
+        rqc_sent_editor_assignments=Subquery(sent_editor_assignments, output_field=JSONField()),
+        rqc_journal_salt=Subquery(journal_salt),
+    ).get(pk=article.pk)
+
+    # If a submission call has already been successfully made for the article
+    # the already submitted editor list is sent again, see get_editors_info.
+    sent = loaded_article.rqc_sent_editor_assignments
+    if sent is None:
+        editor_assignments = tuple(loaded_article.editorassignment_set.select_related('editor').only(
+            'editor_type', *[f'editor__{field}' for field in EDITOR_FIELDS]
+        ).order_by('-assigned'))
+        decision_drafts = tuple(loaded_article.decisiondraft_set.select_related('editor', 'section_editor').only(
+            *[f'editor__{field}' for field in EDITOR_FIELDS],
+            *[f'section_editor__{field}' for field in EDITOR_FIELDS],
+        ))
+    else:
+        editor_assignments = ()
+        decision_drafts = ()
+
+    # If a review assignment was not accepted this date field will be null.
+    # Reviewers that have not accepted a review assignment are not considered for grading by RQC.
+
+    # If data for the submission has already been sent to RQC, and it includes a reviewer
+    # that has declined to review AFTER having accepted initially AND the data that was sent
+    # includes said reviewer the review assignment is treated as having been accepted, and
+    # not completed.
+    review_assignments = tuple(loaded_article.reviewassignment_set.filter(
+        Q(date_accepted__isnull=False) # ReviewAssignment not accepted
+        | Q(
+            date_declined__isnull=False, # Assignment was declined but only after data has been sent to RQC
+            rqcrevieweroptingdecisionforreviewassignment__sent_to_rqc=True
+        )
+    ).select_related(
+        'reviewer', 'rqcrevieweroptingdecisionforreviewassignment'
+    ).order_by("date_requested"))  # To create a persistent ordering. Careful date_accepted gets deleted!
+    payload_version, review_versions = get_review_versions(
+        loaded_article.pk, [review_assignment.pk for review_assignment in review_assignments]
+    )
+    cached_reviews = get_cached_reviews(review_versions) if use_cache else {}
+    uncached_review_assignments = [review_assignment for review_assignment in review_assignments
+                                   if review_assignment.pk not in cached_reviews]
+
+    return ArticleContext(
+        article=loaded_article,
+        journal=journal,
+        correspondence_author=loaded_article.correspondence_author,
+        correspondence_author_order=loaded_article.rqc_correspondence_author_order,
+        decision=convert_editorial_decision_to_rqc_format(
+            loaded_article.is_accepted(),
+            loaded_article.date_declined is not None,
+            loaded_article.rqc_latest_revision_type,
+        ),
+        sent_editor_assignments=sent,
+        editor_assignments=editor_assignments,
+        decision_drafts=decision_drafts,
+        review_assignments=review_assignments,
+        payload_version=payload_version,
+        review_versions=review_versions,
+        cached_reviews=cached_reviews,
+        review_form_answers=get_review_form_answers(uncached_review_assignments),
+        journal_salt=loaded_article.rqc_journal_salt,
+    )
+
+def fetch_post_data(article, journal, mhs_submissionpage = '', is_interactive = False, user = None, use_cache = True):
     """ Generates and collects all information for a RQC submission
     :param user: User object
     :param article: Article object
     :param journal: Journal object
     :param mhs_submissionpage: str Redirect URL from RQC back to Janeway
     :param is_interactive: Boolean flag to enable interactive call mode which redirects to RQC
+    :param use_cache: Boolean flag. If False the article data is built even if it is cached.
     :return: Dictionary of submission data
     """
     submission_data = {}
@@ -43,39 +174,71 @@ def fetch_post_data(article, journal, mhs_submissionpage = '', is_interactive =
     else:
         submission_data['mhs_submissionpage'] = ''
 
+    submission_data.update(get_article_data(article, journal, use_cache))
+    return submission_data
+
+def get_article_data(article, journal, use_cache=True):
+    """ Returns the submission data that only depends on the article. The data is cached until
+    the article or its reviews, editors or decisions change (see payload_cache.py).
+    :param article: Article object
+    :param journal: Journal object
+    :param use_cache: Boolean flag. If False the data is built even if it is cached. The built data is cached.
+    :return: Dictionary of article data
+    """
+    # The version is read before the data is loaded. A change is committed together with a new
+    # version, so data cached under this version was built from a state at least as new as it.
+    version = get_payload_version(article.pk)
+    article_data = get_cached_payload(article.pk, version) if use_cache else None
+    if article_data is not None:
+        return article_data
+
+    context = load_article_context(article, journal, use_cache)
+    article = context.article
+    article_data = {}
+
     # RQC requires that single line strings don't exceed 2000 characters
     # and that multi lines string don't exceed 200 000 characters.
     # Field constraints in the models already enforce this, but we double-check for safety.
-    submission_data['title'] = article.title[:MAX_SINGLE_LINE_STRING_LENGTH]
+    article_data['title'] = article.title[:MAX_SINGLE_LINE_STRING_LENGTH]
 
-    submission_data['external_uid'] = str(article.pk)
+    article_data['external_uid'] = str(article.pk)
     # The primary key is just a number because Django's auto-increment pk is used
-    submission_data['visible_uid'] = str(article.pk)
+    article_data['visible_uid'] = str(article.pk)
 
     # RQC requires all datetime values to be in UTC
     # Janeway uses aware timezones and the default timezone is UTC per the general settings
-    submission_data['submitted'] = convert_date_to_rqc_format(article.date_submitted)
+    article_data['submitted'] = convert_date_to_rqc_format(article.date_submitted)
 
-    submission_data['author_set'] = get_authors_info(article)
+    article_data['author_set'] = get_authors_info(context)
 
-    submission_data['edassgmt_set'] = get_editors_info(article)
+    article_data['edassgmt_set'] = get_editors_info(context)
 
-    submission_data['review_set'] = get_reviews_info(article, journal)
+    built_reviews = {}
+    article_data['review_set'] = get_reviews_info(context, built_reviews)
 
-    submission_data['decision'] = get_editorial_decision(article)
-    return submission_data
+    article_data['decision'] = context.decision
 
+    # Every change of the article's data replaces its version. If the version did not change while
+    # the review assignments were loaded, they match their versions and the data can be cached.
+    if context.payload_version == version:
+        set_cached_reviews(built_reviews, context.review_versions)
+        set_cached_payload(article.pk, version, article_data)
+    return article_data
 
-def get_authors_info(article):
+def get_authors_info(context):
     """ Returns the authors info for an article
-    :param article: Article object
+    :param context: ArticleContext of the article
     :return: List of author information
     """
     # The RQC API specifies that only information from correspondence authors
     # should be transmitted. In janeway there can only be one correspondence author
     # so the author_set will only contain one member.
-    author = article.correspondence_author
-    author_order = article.frozenauthor_set.filter(author=author).first()
+    author = context.correspondence_author
+    author_order = context.correspondence_author_order
+    if author_order is None:
+        logging.warning("RQC Call: Article %s has no frozen author record of its correspondence author. "
+                        "The author is sent with order number 1.", context.article.pk)
+        author_order = 0
     author_set = []
     author_info = {
         'email': author.email[:MAX_SINGLE_LINE_STRING_LENGTH],
@@ -84,15 +247,15 @@ def get_authors_info(article):
         'orcid_id': author.orcid[:MAX_SINGLE_LINE_STRING_LENGTH] if author.orcid else None,
         # Add 1 because RQC author numbering starts at 1 while in Janeway counting starts at  0
         # even though default value for order is 1.
-        'order_number': author_order.order+1
+        'order_number': author_order+1
     }
     author_set.append(author_info)
     return author_set
 
-def get_editors_info(article):
-    """ Returns the information about the editors of the article. Retrieves saved list from
-    RQCCall model if it exists.
-    :param article: Article Object
+def get_editors_info(context):
+    """ Returns the information about the editors of the article. Returns the saved list from
+    the RQCCall model if a call was already made.
+    :param context: ArticleContext of the article
     :return: List of editor info
     """
     # If a submission call has already been successfully made for the article
@@ -100,11 +263,8 @@ def get_editors_info(article):
     # doesn't change in subsequent calls.
     # Changing the assigned editors past the 'Unassigned' workflow stage
     # is probably unusual but in theory possible.
-    try:
-        call_record = RQCCall.objects.get(article=article)
-        return call_record.editor_assignments
-    except RQCCall.DoesNotExist:
-        pass
+    if context.sent_editor_assignments is not None:
+        return context.sent_editor_assignments
 
     edassgmt_set = []
 
@@ -120,8 +280,7 @@ def get_editors_info(article):
 
     # Editors that are assigned to the submission are given level 3
     # Assigned section editors get level 1
-    editor_assignments = article.editorassignment_set.order_by('-assigned')
-    for editor_assignment in editor_assignments:
+    for editor_assignment in context.editor_assignments:
         if editor_assignment.editor_type == 'editor':
             info = get_editor_info(editor_assignment.editor, 3)
         else:
@@ -135,8 +294,7 @@ def get_editors_info(article):
 
     # If an editor was involved in reviewing a decision draft then that
     # editor is also associated with the submission and will be included.
-    decision_drafts = article.decisiondraft_set.all()
-    for draft in decision_drafts:
+    for draft in context.decision_drafts:
         # All section editors should be already included.
         # This is just here to be very safe incase the constraint that
         # a section editor has to be assigned in order to make a
@@ -182,67 +340,101 @@ def get_editor_info(editor, level):
         }
     return editor_data
 
-def get_reviews_info(article, journal):
-    """ Returns the info for all reviews for the given article in a list
-    :param article: Article object
-    :param journal: Journal object
+def get_reviews_info(context, built_reviews=None):
+    """ Returns the info for all reviews for the given article in a list.
+    Cached review entries are reused, only the others are built.
+    :param context: ArticleContext of the article
+    :param built_reviews: dict: If given, receives the review entries that were built by review assignment id
     :return: List of review info
     """
     review_set = []
-    # If a review assignment was not accepted this date field will be null.
-    # Reviewers that have not accepted a review assignment are not considered for grading by RQC.
-
-    # If data for the submission has already been sent to RQC, and it includes a reviewer
-    # that has declined to review AFTER having accepted initially AND the data that was sent
-    # includes said reviewer the review assignment is treated as having been accepted, and
-    # not completed.
-    review_assignments = article.reviewassignment_set.filter(
-        Q(date_accepted__isnull=False) # ReviewAssignment not accepted
-        | Q(
-            date_declined__isnull=False, # Assignment was declined but only after data has been sent to RQC
-            rqcrevieweroptingdecisionforreviewassignment__sent_to_rqc=True
-        )
-    ).order_by("date_requested")  # To create a persistent ordering. Careful date_accepted gets deleted!
-    review_num = 1
-    for review_assignment in review_assignments:
-        reviewer = review_assignment.reviewer
-        review_assignment_answers = [ra.answer for ra in review_assignment.review_form_answers()]
-        review_text = " ".join(review_assignment_answers)
-        reviewer_has_opted_in = has_opted_in(review_assignment)
-
-        review_data = {
+    journal_salt = context.journal_salt
+    for review_num, review_assignment in enumerate(context.review_assignments, start=1):
+        review_info = context.cached_reviews.get(review_assignment.pk)
+        if review_info is None:
+            # The salt is only needed for reviewers that are anonymised. It is created if the journal has none yet.
+            if not has_opted_in(review_assignment) and journal_salt is None:
+                journal_salt = get_journal_salt(context.journal)
+            review_info = get_review_info(review_assignment,
+                                          context.review_form_answers.get(review_assignment.pk, []),
+                                          context.journal,
+                                          journal_salt)
+            if built_reviews is not None:
+                built_reviews[review_assignment.pk] = review_info
+        review_set.append({
             # Visible id is just supposed to identify the review as a sort of name.
             # An integer ordering by the acceptance date is used starting at 1 for the oldest review assignment.
+            # It depends on the position of the review, so it is not part of the cached review entry.
             'visible_id': str(review_num),
-            'invited': convert_date_to_rqc_format(review_assignment.date_requested) if review_assignment.date_requested else None,
-            'agreed': convert_date_to_rqc_format(review_assignment.date_accepted) if review_assignment.date_accepted else None,
-            'expected': convert_date_to_rqc_format(review_assignment.date_due) if review_assignment.date_due else None,
-            'submitted': convert_date_to_rqc_format(review_assignment.date_complete) if review_assignment.date_complete else None,
-            'text': review_text[:MAX_SINGLE_LINE_STRING_LENGTH] if reviewer_has_opted_in else '',
-            # Review text is always HTML.
-            # This is due to the text input being collected in the TinyMCE widget.
-            'is_html': True,
-            'suggested_decision': convert_review_decision_to_rqc_format(review_assignment.decision),
-            'reviewer': get_reviewer_info(reviewer, reviewer_has_opted_in, journal),
-            # Because RQC does not yet support attachments the attachment set is left empty.
-            # review_data['attachment_set'] = get_attachment(article, review_file=article.review_file)
-            'attachment_set': []
-        }
-        review_set.append(review_data)
-        review_num = review_num + 1
+            **review_info,
+        })
         # Log reviews that are cut off. Reviews are holy so this might be relevant.
         # TODO Should something happen with the reviews that were cut off?
     if len(review_set) > 20:
-        logging.info(f"RQC Call: Number of reviews exceeded {MAX_LIST_LENGTH}. {len(review_set)-MAX_LIST_LENGTH} reviews were not included in the call. Entire review_set: {review_set}")
+        logging.info("RQC Call: Number of reviews exceeded %s. %s reviews were not included in the call. Entire review_set: %s",
+                     MAX_LIST_LENGTH, len(review_set)-MAX_LIST_LENGTH, LogValue(review_set))
     return review_set[:MAX_LIST_LENGTH]
 
+def get_review_info(review_assignment, review_assignment_answers, journal, journal_salt=None):
+    """ Returns the info for one review without its visible id.
+    :param review_assignment: ReviewAssignment object loaded with its reviewer and opting decision
+    :param review_assignment_answers: List of the answers of the review assignment
+    :param journal: Journal object
+    :param journal_salt: str: Salt of the journal. Retrieved from the database if None and needed.
+    :return: Dictionary of review info
+    """
+    review_text = " ".join(review_assignment_answers)
+    reviewer_has_opted_in = has_opted_in(review_assignment)
+    return {
+        'invited': convert_date_to_rqc_format(review_assignment.date_requested) if review_assignment.date_requested else None,
+        'agreed': convert_date_to_rqc_format(review_assignment.date_accepted) if review_assignment.date_accepted else None,
+        'expected': convert_date_to_rqc_format(review_assignment.date_due) if review_assignment.date_due else None,
+        'submitted': convert_date_to_rqc_format(review_assignment.date_complete) if review_assignment.date_complete else None,
+        'text': review_text[:MAX_SINGLE_LINE_STRING_LENGTH] if reviewer_has_opted_in else '',
+        # Review text is always HTML.
+        # This is due to the text input being collected in the TinyMCE widget.
+        'is_html': True,
+        'suggested_decision': convert_review_decision_to_rqc_format(review_assignment.decision),
+        'reviewer': get_reviewer_info(review_assignment.reviewer, reviewer_has_opted_in, journal, journal_salt),
+        # Because RQC does not yet support attachments the attachment set is left empty.
+        # review_data['attachment_set'] = get_attachment(article, review_file=article.review_file)
+        'attachment_set': []
+    }
+
+def get_review_form_answers(review_assignments):
+    """ Loads the review form answers of all given review assignments in one query.
+    Answers are ordered like in ReviewAssignment.review_form_answers.
+    :param review_assignments: List of ReviewAssignment objects
+    :return: Dictionary of review assignment id to list of answers
+    """
+    answers_by_assignment = defaultdict(list)
+    if not review_assignments:
+        return answers_by_assignment
+    answers = ReviewAssignmentAnswer.objects.filter(
+        assignment__in=review_assignments
+    ).order_by('assignment_id', 'frozen_element__order', 'pk').values_list('assignment_id', 'answer')
+    for assignment_id, answer in answers:
+        answers_by_assignment[assignment_id].append(answer)
+    return answers_by_assignment
+
+def get_journal_salt(journal):
+    """ Returns the salt used for anonymising the reviewers of the journal. Creates it if necessary.
+    :param journal: Journal object
+    :return: str: Salt
+    """
+    salt = get_journal_config(journal.pk).salt
+    if salt is not None:
+        return salt
+    journal_salt, created = RQCJournalSalt.objects.get_or_create(journal=journal, defaults={'salt': generate_random_salt()})
+    return journal_salt.salt
+
 def has_opted_in(review_assignment):
     """ Determines if reviewer has opted into RQC
     :param review_assignment: Review Assignment object
     :return: True if reviewer has opted in and False otherwise
     """
     try:
-        opting_status = RQCReviewerOptingDecisionForReviewAssignment.objects.filter(review_assignment = review_assignment).first().opting_status
+        opting_status = review_assignment.rqcrevieweroptingdecisionforreviewassignment.opting_status
     except (AttributeError, RQCReviewerOptingDecisionForReviewAssignment.DoesNotExist):
         opting_status = None
     if opting_status == RQCReviewerOptingDecision.OptingChoices.OPT_IN:
@@ -250,11 +442,12 @@ def has_opted_in(review_assignment):
     else:
         return False
 
-def get_reviewer_info(reviewer, reviewer_has_opted_in, journal):
+def get_reviewer_info(reviewer, reviewer_has_opted_in, journal, salt=None):
     """ Gets the reviewer's information. If the reviewer has not opted in return pseudo address and empty values instead
     :param reviewer: Reviewer object
     :param reviewer_has_opted_in: True if reviewer has opted in
     :param journal: Journal object
+    :param salt: str: Salt of the journal. Retrieved from the database if None.
     :return reviewer_info: dictionary {'email': str, 'firstname': str, 'lastname': str, 'orcid_id': str}
     """
     if reviewer_has_opted_in:
@@ -266,9 +459,10 @@ def get_reviewer_info(reviewer, reviewer_has_opted_in, journal):
         }
     # If a reviewer has opted out RQC requires that the email address is anonymised and no additional data is transmitted
     else:
-        journal_salt, created = RQCJournalSalt.objects.get_or_create(journal=journal, defaults={'salt': generate_random_salt()})
+        if salt is None:
+            salt = get_journal_salt(journal)
         reviewer_data = {
-            'email': create_pseudo_address(reviewer.email, journal_salt.salt),
+            'email': create_pseudo_address(reviewer.email, salt),
             'firstname': '',
             'lastname': '',
             'orcid_id': None
@@ -18,6 +18,7 @@ from core import (
     models as core_models,
 )
 import submission.models
+from plugins.rqc_adapter.journal_config import clear_journal_configs
 from plugins.rqc_adapter.models import RQCReviewerOptingDecisionForReviewAssignment, RQCReviewerOptingDecision, \
     RQCJournalAPICredentials
 from utils.testing import helpers
@@ -39,6 +40,11 @@ class RQCAdapterBaseTestCase(TestCase):
     OPT_OUT = RQCReviewerOptingDecision.OptingChoices.OPT_OUT
     UNDEFINED = RQCReviewerOptingDecision.OptingChoices.UNDEFINED
 
+    def setUp(self):
+        super().setUp()
+        # Rolled back test data doesn't send signals, so configuration cached by a previous test could remain.
+        clear_journal_configs()
+
     @staticmethod
     def assign_dates_to_review_assignment(review_assignment, delta_weeks_requested , delta_days_accepted):
         review_assignment.date_requested = datetime.now(timezone.utc) - timedelta(weeks=delta_weeks_requested)
@@ -4,19 +4,24 @@
 This file contains tests for calls to the mhs_submission endpoint.
 """
 import os
+import signal
 from datetime import timedelta
 from unittest import skipUnless
 from unittest.mock import patch, MagicMock, Mock
 
 from django.conf import settings
 from django.contrib.messages import get_messages
-from django.core.management import call_command
+from django.core.management import CommandError, call_command
 from django.utils import timezone
 
+from plugins.rqc_adapter.config import DELAYED_CALL_MAX_TRIES, IMPLICIT_CALL_DEBOUNCE
+from plugins.rqc_adapter.dispatcher import enqueue_submission
 from plugins.rqc_adapter.events import implicit_call_mhs_submission
+from plugins.rqc_adapter.management.commands.rqc_make_delayed_calls import Command as DelayedCallsCommand
 from plugins.rqc_adapter.models import RQCReviewerOptingDecision, \
     RQCReviewerOptingDecisionForReviewAssignment, RQCDelayedCall, RQCCall, RQCJournalAPICredentials
-from plugins.rqc_adapter.rqc_calls import RQCErrorCodes
+from plugins.rqc_adapter.rqc_calls import RQCErrorCodes, call_mhs_submission, hash_submission_data
+from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
 from plugins.rqc_adapter.tests.base_test import RQCAdapterBaseTestCase
 from django.urls import reverse
 
@@ -88,6 +93,11 @@ class TestCallsToMHSSubmissionEndpointMocked(TestCallsToMHSSubmissionEndpoint):
         patcher = patch('plugins.rqc_adapter.rqc_calls.call_rqc_api')
         self.mock_call = patcher.start()
         self.addCleanup(patcher.stop)
+        # Delayed calls are made in the test thread. Worker threads use their own database
+        # connections and would not see the data of the test transaction.
+        workers_patcher = patch('plugins.rqc_adapter.management.commands.rqc_make_delayed_calls.DELAYED_CALL_MAX_WORKERS', 1)
+        workers_patcher.start()
+        self.addCleanup(workers_patcher.stop)
 
 
 class TestExplicitCalls(TestCallsToMHSSubmissionEndpointMocked):
@@ -257,6 +267,18 @@ class TestImplicitCalls(TestCallsToMHSSubmissionEndpointMocked):
         }
         self.client.post(reverse(self.make_editorial_decision_view, args=[self.active_article.id, decision]), form_data)
 
+    def make_queued_calls_due(self):
+        """Simulates that the debounce window of the queued calls has passed."""
+        RQCDelayedCall.objects.update(next_attempt_at=utc_now())
+
+    def assert_call_queued_and_sent(self):
+        """Asserts that a call was queued for the active article and is sent by the dispatcher."""
+        self.assertTrue(RQCDelayedCall.objects.filter(article=self.active_article).exists())
+        self.mock_call.assert_not_called()
+        self.make_queued_calls_due()
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_called()
+
     def test_implicit_calls_with_article_argument(self):
         """Just tests if implicit_call_mhs_submission function call results in a call to RQC"""
         kwargs = {
@@ -264,7 +286,43 @@ class TestImplicitCalls(TestCallsToMHSSubmissionEndpointMocked):
             'request': None
         }
         implicit_call_mhs_submission(**kwargs)
-        self.mock_call.assert_called()
+        self.assert_call_queued_and_sent()
+
+    def test_implicit_call_does_not_wait_for_rqc(self):
+        """Tests that the implicit call only queues the submission and makes no call to RQC."""
+        kwargs = {
+            'article': self.active_article,
+            'request': None
+        }
+        delayed_call = implicit_call_mhs_submission(**kwargs)
+        self.mock_call.assert_not_called()
+        self.assertEqual(delayed_call.remaining_tries, 10)
+        self.assertIsNone(delayed_call.last_attempt_at)
+        self.assertIsNone(delayed_call.failure_reason)
+
+    def test_implicit_call_not_queued_without_credentials(self):
+        """Tests that no call is queued for journals without RQC credentials."""
+        RQCJournalAPICredentials.objects.filter(journal=self.journal_one).delete()
+        kwargs = {
+            'article': self.active_article,
+            'request': None
+        }
+        self.assertIsNone(implicit_call_mhs_submission(**kwargs))
+        self.assertFalse(RQCDelayedCall.objects.filter(article=self.active_article).exists())
+
+    @patch('plugins.rqc_adapter.in_process_dispatcher.IN_PROCESS_DISPATCHER_ENABLED', True)
+    @patch('plugins.rqc_adapter.in_process_dispatcher.get_dispatcher')
+    def test_implicit_call_handed_to_in_process_dispatcher_on_commit(self, mock_get_dispatcher):
+        """Tests that with the in-process dispatcher enabled the queued call is handed to it after commit."""
+        kwargs = {
+            'article': self.active_article,
+            'request': None
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            delayed_call = implicit_call_mhs_submission(**kwargs)
+        mock_get_dispatcher.return_value.submit.assert_called_once_with(delayed_call.pk,
+                                                                         delayed_call.next_attempt_at)
+        self.mock_call.assert_not_called()
 
     def tests_that_interactive_user_is_not_set(self):
         """Test that interactive user is not set when making an implicit call"""
@@ -273,7 +331,7 @@ class TestImplicitCalls(TestCallsToMHSSubmissionEndpointMocked):
             'request': None
         }
         implicit_call_mhs_submission(**kwargs)
-        self.mock_call.assert_called()
+        self.assert_call_queued_and_sent()
         args, kwargs = self.mock_call.call_args
         post_data = kwargs.get('post_data')
         self.assertEqual(post_data.get('interactive_user'), '')
@@ -292,14 +350,34 @@ class TestImplicitCalls(TestCallsToMHSSubmissionEndpointMocked):
             'request': None
         }
         implicit_call_mhs_submission(**kwargs)
-        self.mock_call.assert_called()
+        self.assert_call_queued_and_sent()
 
     def test_implicit_call_made_upon_editorial_decision(self):
         """Tests if implicit calls are made upon editorial decision"""
         editorial_decisions = ['accept', 'decline', 'undecline']
         for decision in editorial_decisions:
             self.make_editorial_decision(decision)
-            self.mock_call.assert_called()
+            self.assertTrue(RQCDelayedCall.objects.filter(article=self.active_article).exists())
+        self.make_queued_calls_due()
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_called()
+
+    def test_decisions_within_debounce_window_result_in_one_call(self):
+        """Tests that several decisions in quick succession are sent to RQC in one call after the window."""
+        kwargs = {
+            'article': self.active_article,
+            'request': None
+        }
+        for _ in range(3):
+            implicit_call_mhs_submission(**kwargs)
+        delayed_call = RQCDelayedCall.objects.get(article=self.active_article)
+        self.assertGreater(delayed_call.next_attempt_at, utc_now())
+        # Nothing is sent within the window.
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_not_called()
+        self.make_queued_calls_due()
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_called_once()
 
     # TODO currently should not work due to the ON_REVISIONS_REQUESTED event not firing
     def test_implicit_call_made_upon_revisions_requested(self):
@@ -312,7 +390,7 @@ class TestImplicitCalls(TestCallsToMHSSubmissionEndpointMocked):
                     article=self.active_article, editor=self.editor
                 ).exists()
             )
-            self.mock_call.assert_called()
+            self.assertTrue(RQCDelayedCall.objects.filter(article=self.active_article).exists())
 
 # Delayed Calls
 class TestDelayedCalls(TestCallsToMHSSubmissionEndpointMocked):
@@ -320,7 +398,8 @@ class TestDelayedCalls(TestCallsToMHSSubmissionEndpointMocked):
     def test_delayed_call_created(self):
         """Test that a delayed call is created with the given status codes"""
         response_codes = [500, 502, 503, 504] + [RQCErrorCodes.CONNECTION_ERROR,
-                                                  RQCErrorCodes.TIMEOUT, RQCErrorCodes.REQUEST_ERROR]
+                                                  RQCErrorCodes.TIMEOUT, RQCErrorCodes.REQUEST_ERROR,
+                                                  RQCErrorCodes.CIRCUIT_OPEN]
         for response_code in response_codes:
             self.mock_call.return_value = self.create_mock_call_return_value(success=False, http_status_code=response_code)
             self.post_to_rqc(self.active_article.id)
@@ -351,9 +430,20 @@ class TestDelayedCalls(TestCallsToMHSSubmissionEndpointMocked):
         mock_crontab.assert_called_once_with(user=True)
         expected_command = f"/mock/virtualenv/bin/python3 {settings.BASE_DIR}/manage.py rqc_make_delayed_calls"
         mock_tab.new.assert_called_once_with(expected_command)
-        mock_job.setall.assert_called_once_with("0 8 * * *")
+        mock_job.setall.assert_called_once_with("*/5 * * * *")
         mock_tab.write.assert_called_once()
 
+    @patch('rqc_adapter.management.commands.rqc_install_cronjob.crontab.CronTab')
+    def test_daily_cron_tab_created(self, mock_crontab):
+        """Tests that --time installs a daily crontab."""
+        mock_tab = MagicMock()
+        mock_job = MagicMock()
+        mock_crontab.return_value = mock_tab
+        mock_tab.new.return_value = mock_job
+
+        call_command('rqc_install_cronjob', action='install', time=8)
+        mock_job.setall.assert_called_once_with("0 8 * * *")
+
     def test_successful_delayed_call_deletes_entry(self):
         """If delayed call succeeds, it should be deleted from DB."""
         # Create delayed call
@@ -396,6 +486,225 @@ class TestDelayedCalls(TestCallsToMHSSubmissionEndpointMocked):
         call_command("rqc_make_delayed_calls")
         self.assertFalse(RQCDelayedCall.objects.filter(pk=delayed_call.pk).exists())
 
+    def test_missing_credentials_only_stop_their_journal(self):
+        """Tests that calls for a journal without API credentials don't block calls for other journals."""
+        other_article = helpers.create_article(journal=self.journal_two)
+        other_call = RQCDelayedCall.objects.create(article=other_article, remaining_tries=10)
+        delayed_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10)
+        self.mock_call.return_value = {"success": True}
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_called_once()
+        self.assertFalse(RQCDelayedCall.objects.filter(pk=delayed_call.pk).exists())
+        self.assertTrue(RQCDelayedCall.objects.filter(pk=other_call.pk).exists())
+
+    def test_failed_call_stops_remaining_calls_of_journal(self):
+        """Tests that after a failed call the other calls of that journal are left for the next run."""
+        RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10)
+        RQCDelayedCall.objects.create(article=self.active_article_two, remaining_tries=10)
+        self.mock_call.return_value = {"success": False}
+        call_command("rqc_make_delayed_calls", workers_per_journal=1)
+        self.mock_call.assert_called_once()
+        self.assertEqual(RQCDelayedCall.objects.filter(article__journal=self.journal_one).count(), 2)
+
+    def test_invalid_numbers_are_rejected(self):
+        """Tests that zero workers or a zero interval are rejected instead of being replaced by the defaults."""
+        for options in ({'workers': 0}, {'workers_per_journal': 0}, {'daemon': True, 'interval': 0}):
+            with self.subTest(**options):
+                with self.assertRaises(CommandError):
+                    call_command("rqc_make_delayed_calls", **options)
+        self.mock_call.assert_not_called()
+
+    def test_call_that_raises_is_rescheduled(self):
+        """Tests that a call that raises an error uses up a try and is rescheduled instead of being retried on every run."""
+        delayed_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10)
+        with patch('plugins.rqc_adapter.dispatcher.fetch_post_data', side_effect=ValueError('No correspondence author')):
+            call_command("rqc_make_delayed_calls")
+        delayed_call.refresh_from_db()
+        self.assertEqual(delayed_call.remaining_tries, 9)
+        self.assertGreater(delayed_call.next_attempt_at, utc_now())
+        self.assertIn('No correspondence author', delayed_call.failure_reason)
+        self.assertEqual(len(delayed_call.failure_history), 1)
+        self.assertIsNone(delayed_call.claimed_by)
+        self.mock_call.assert_not_called()
+
+    def test_call_queued_again_during_failed_attempt_keeps_new_schedule(self):
+        """Tests that a failed attempt does not overwrite the schedule of a call that was queued again meanwhile."""
+        delayed_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=5)
+
+        def queue_again_and_fail(*args, **kwargs):
+            enqueue_submission(self.active_article)
+            return self.create_mock_call_return_value(success=False, http_status_code=503)
+
+        self.mock_call.side_effect = queue_again_and_fail
+        call_command("rqc_make_delayed_calls")
+        delayed_call.refresh_from_db()
+        self.assertEqual(delayed_call.remaining_tries, DELAYED_CALL_MAX_TRIES)
+        self.assertEqual(delayed_call.failure_history, [])
+        self.assertLessEqual(delayed_call.next_attempt_at, utc_now() + timedelta(seconds=IMPLICIT_CALL_DEBOUNCE))
+        self.assertIsNone(delayed_call.claimed_by)
+
+    def test_failed_delayed_call_is_rescheduled_with_backoff(self):
+        """Tests that the delay before the next attempt grows with every failed attempt."""
+        delayed_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10)
+        self.mock_call.return_value = {"success": False, "http_status_code": 503}
+        delays = []
+        for _ in range(3):
+            RQCDelayedCall.objects.filter(pk=delayed_call.pk).update(next_attempt_at=utc_now())
+            call_command("rqc_make_delayed_calls")
+            delayed_call.refresh_from_db()
+            delays.append(delayed_call.next_attempt_at - delayed_call.last_attempt_at)
+        self.assertEqual(delayed_call.failure_reason, "503")
+        self.assertEqual(delayed_call.remaining_tries, 7)
+        # With a jitter of less than a third each delay is longer than the previous one.
+        self.assertLess(delays[0], delays[1])
+        self.assertLess(delays[1], delays[2])
+
+    def test_due_calls_are_made_oldest_first(self):
+        """Tests that the call that has been due the longest is made first."""
+        RQCDelayedCall.objects.create(article=self.active_article_two, remaining_tries=10,
+                                      next_attempt_at=utc_now() - timedelta(hours=1))
+        RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10,
+                                      next_attempt_at=utc_now() - timedelta(hours=2))
+        self.mock_call.return_value = {"success": True}
+        call_command("rqc_make_delayed_calls")
+        articles = [kwargs.get('article') for args, kwargs in self.mock_call.call_args_list]
+        self.assertEqual(articles, [self.active_article, self.active_article_two])
+
+    def test_delayed_call_created_after_failure_is_not_due_immediately(self):
+        """Tests that a call queued after a failed interactive call waits before the first retry."""
+        self.mock_call.return_value = self.create_mock_call_return_value(success=False, http_status_code=503)
+        self.post_to_rqc(self.active_article.id)
+        delayed_call = RQCDelayedCall.objects.get(article=self.active_article)
+        self.assertGreater(delayed_call.next_attempt_at, utc_now())
+
+    def test_call_claimed_by_other_worker_is_skipped(self):
+        """Tests that a call with an active claim of another worker is not made twice."""
+        delayed_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10,
+                                                     claimed_by='other-node:1:abc',
+                                                     claimed_until=utc_now() + timedelta(minutes=10))
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_not_called()
+        delayed_call.refresh_from_db()
+        self.assertEqual(delayed_call.remaining_tries, 10)
+
+    def test_expired_claim_is_reclaimed(self):
+        """Tests that a call claimed by a crashed worker is made after the lease expired."""
+        delayed_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10,
+                                                     claimed_by='other-node:1:abc',
+                                                     claimed_until=utc_now() - timedelta(minutes=1))
+        self.mock_call.return_value = {"success": False}
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_called_once()
+        delayed_call.refresh_from_db()
+        self.assertEqual(delayed_call.remaining_tries, 9)
+        # The claim is released after the attempt.
+        self.assertIsNone(delayed_call.claimed_by)
+        self.assertIsNone(delayed_call.claimed_until)
+
+    def test_repeated_failures_are_merged_into_one_delayed_call(self):
+        """Tests that repeated failures for one article update the queued call instead of adding new ones."""
+        for response_code in [502, 503]:
+            self.mock_call.return_value = self.create_mock_call_return_value(success=False,
+                                                                             http_status_code=response_code)
+            self.post_to_rqc(self.active_article.id)
+        delayed_call = RQCDelayedCall.objects.get(article=self.active_article)
+        self.assertEqual(delayed_call.failure_reason, "503")
+        self.assertEqual([failure['reason'] for failure in delayed_call.failure_history], ["502", "503"])
+
+    def test_new_failure_resets_tries_of_queued_call(self):
+        """Tests that a failure for an article with a queued call resets the tries and schedule of that call."""
+        RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=2,
+                                      next_attempt_at=utc_now() + timedelta(days=1))
+        self.mock_call.return_value = self.create_mock_call_return_value(success=False, http_status_code=500)
+        self.post_to_rqc(self.active_article.id)
+        delayed_call = RQCDelayedCall.objects.get(article=self.active_article)
+        self.assertEqual(delayed_call.remaining_tries, 10)
+        self.assertLess(delayed_call.next_attempt_at, utc_now() + timedelta(days=1))
+
+    @patch('plugins.rqc_adapter.management.commands.rqc_make_delayed_calls.close_old_connections')
+    def test_daemon_finishes_current_call_before_stopping(self, mock_close_connections):
+        """Tests that a stop request in daemon mode lets the current call finish and then stops the worker."""
+        first_call = RQCDelayedCall.objects.create(article=self.active_article, remaining_tries=10)
+        second_call = RQCDelayedCall.objects.create(article=self.active_article_two, remaining_tries=10)
+        command = DelayedCallsCommand()
+
+        def stop_during_call(*args, **kwargs):
+            command.request_stop(signal.SIGTERM, None)
+            return {'success': True}
+
+        self.mock_call.side_effect = stop_during_call
+        call_command(command, daemon=True, interval=1)
+        self.mock_call.assert_called_once()
+        # Exactly one of the calls was made and removed from the queue.
+        self.assertEqual(RQCDelayedCall.objects.filter(pk__in=[first_call.pk, second_call.pk]).count(), 1)
+
+    def test_call_that_is_not_due_is_skipped(self):
+        """Tests that calls are not made before their next attempt is due."""
+        delayed_call = RQCDelayedCall.objects.create(
+            article=self.active_article,
+            failure_reason="500",
+            remaining_tries=5,
+            last_attempt_at=utc_now() - timedelta(minutes=5),
+            next_attempt_at=utc_now() + timedelta(minutes=5),
+        )
+        call_command("rqc_make_delayed_calls")
+        self.mock_call.assert_not_called()
+        delayed_call.refresh_from_db()
+        self.assertEqual(delayed_call.remaining_tries, 5)
+
+class TestUnchangedSubmissionData(TestCallsToMHSSubmissionEndpointMocked):
+
+    def setUp(self):
+        super().setUp()
+        self.mock_call.return_value = self.create_mock_call_return_value()
+        self.post_data = fetch_post_data(self.active_article, self.journal_one)
+
+    def call_mhs_submission(self, post_data):
+        return call_mhs_submission(9, 'Test key', self.active_article.pk, post_data, self.active_article)
+
+    def test_unchanged_submission_data_is_not_sent_again(self):
+        """Tests that a non-interactive call is skipped if RQC already accepted the same data."""
+        RQCCall.objects.create(article=self.active_article,
+                               editor_assignments=self.post_data['edassgmt_set'],
+                               last_payload_hash=hash_submission_data(self.post_data))
+        result = self.call_mhs_submission(self.post_data)
+        self.mock_call.assert_not_called()
+        self.assertTrue(result['success'])
+        self.assertIsNone(result['http_status_code'])
+
+    def test_call_is_made_if_only_outdated_data_is_unchanged(self):
+        """Tests that a call is not skipped if the given data is outdated but the current data changed."""
+        RQCCall.objects.create(article=self.active_article,
+                               editor_assignments=self.post_data['edassgmt_set'],
+                               last_payload_hash=hash_submission_data(self.post_data))
+        self.opt_in_reviewer_one()
+        result = self.call_mhs_submission(self.post_data)
+        self.mock_call.assert_called_once()
+        self.assertNotEqual(self.mock_call.call_args.kwargs['post_data'], self.post_data)
+        self.assertTrue(result['success'])
+
+    def test_interactive_call_is_made_with_unchanged_data(self):
+        """Tests that interactive calls are made even if the data is unchanged."""
+        RQCCall.objects.create(article=self.active_article,
+                               editor_assignments=self.post_data['edassgmt_set'],
+                               last_payload_hash=hash_submission_data(self.post_data))
+        interactive_post_data = fetch_post_data(self.active_article, self.journal_one,
+                                                'https://example.com', True, self.editor)
+        self.call_mhs_submission(interactive_post_data)
+        self.mock_call.assert_called_once()
+
+    def test_hash_of_accepted_data_is_recorded(self):
+        """Tests that the hash of the accepted data is stored and that changed data is sent."""
+        RQCCall.objects.create(article=self.active_article, editor_assignments=self.post_data['edassgmt_set'])
+        self.call_mhs_submission(self.post_data)
+        call_record = RQCCall.objects.get(article=self.active_article)
+        self.assertEqual(call_record.last_payload_hash, hash_submission_data(self.post_data))
+        self.assertIsNotNone(call_record.last_payload_sent_at)
+
+        self.opt_in_reviewer_one()
+        self.call_mhs_submission(fetch_post_data(self.active_article, self.journal_one))
+        self.assertEqual(self.mock_call.call_count, 2)
+
 @skipUnless(has_api_credentials_env, "No API key found. Cannot make API call integration tests.")
 class TestSubmissionCallsAPIIntegration(TestCallsToMHSSubmissionEndpoint):
     def setUp(self):
@@ -0,0 +1,67 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for delayed calls that are made by the thread pool of rqc_make_delayed_calls.
+The worker threads use their own database connections, so the test data has to be committed.
+"""
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+import submission.models
+from plugins.rqc_adapter.journal_config import clear_journal_configs
+from plugins.rqc_adapter.models import RQCDelayedCall, RQCJournalAPICredentials
+from utils.testing import helpers
+
+
+class TestDelayedCallsInWorkerThreads(TransactionTestCase):
+
+    def setUp(self):
+        clear_journal_configs()
+        self.addCleanup(clear_journal_configs)
+        helpers.create_press()
+        self.journal_one, self.journal_two = helpers.create_journals()
+        helpers.create_roles(['reviewer', 'editor'])
+        self.author = helpers.create_author(self.journal_one)
+        self.articles = [self.create_article(journal, f'Worker Article {journal.pk} {num}')
+                         for journal in (self.journal_one, self.journal_two) for num in range(3)]
+        for num, journal in enumerate((self.journal_one, self.journal_two)):
+            RQCJournalAPICredentials.objects.create(journal=journal, rqc_journal_id=num + 1, api_key='Test key')
+        for article in self.articles:
+            RQCDelayedCall.objects.create(article=article, remaining_tries=10)
+        patcher = patch('plugins.rqc_adapter.rqc_calls.call_rqc_api')
+        self.mock_call = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_article(self, journal, title):
+        article = helpers.create_article(
+            journal=journal,
+            title=title,
+            stage=submission.models.STAGE_UNDER_REVIEW,
+            date_submitted=datetime.now(timezone.utc) - timedelta(weeks=3),
+            correspondence_author=self.author,
+        )
+        article.authors.add(self.author)
+        return article
+
+    def test_calls_are_made_by_the_pool(self):
+        """Tests that all due calls are made and removed from the queue by the worker threads."""
+        self.mock_call.return_value = {'success': True, 'http_status_code': 200}
+        call_command('rqc_make_delayed_calls', workers=4, workers_per_journal=2)
+        self.assertEqual(self.mock_call.call_count, len(self.articles))
+        self.assertFalse(RQCDelayedCall.objects.exists())
+
+    def test_failed_journal_does_not_stop_other_journals(self):
+        """Tests that a failing journal keeps its calls while the calls of the other journal are made."""
+        def call_rqc_api(*args, **kwargs):
+            if kwargs['article'].journal_id == self.journal_one.pk:
+                return {'success': False, 'http_status_code': 503}
+            return {'success': True, 'http_status_code': 200}
+        self.mock_call.side_effect = call_rqc_api
+        call_command('rqc_make_delayed_calls', workers=4, workers_per_journal=1)
+        self.assertEqual(RQCDelayedCall.objects.filter(article__journal=self.journal_one).count(), 3)
+        self.assertFalse(RQCDelayedCall.objects.filter(article__journal=self.journal_two).exists())
+        # The calls of the failed journal are released for the next run.
+        self.assertFalse(RQCDelayedCall.objects.filter(claimed_by__isnull=False).exists())
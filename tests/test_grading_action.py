@@ -0,0 +1,53 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the cache of the 'RQC-grade the reviews' action on the editor's review page.
+"""
+from django.test import RequestFactory, override_settings
+
+from plugins.rqc_adapter.grading_action_cache import CSRF_TOKEN_PLACEHOLDER
+from plugins.rqc_adapter.hooks import render_rqc_grading_action
+from plugins.rqc_adapter.journal_config import preload_journal_configs
+from plugins.rqc_adapter.tests.base_test import RQCAdapterBaseTestCase
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                             'LOCATION': 'rqc-adapter-grading-action-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestGradingActionCache(RQCAdapterBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_journal_credentials(self.journal_one, 1, 'gradingkey')
+        preload_journal_configs()
+
+    def render(self):
+        request = RequestFactory().get('/')
+        request.journal = self.journal_one
+        request.user = self.editor
+        return render_rqc_grading_action({'request': request, 'article': self.active_article})
+
+    def test_grading_action_is_cached(self):
+        """Tests that a repeated render makes no query and contains a CSRF token instead of the placeholder."""
+        first = self.render()
+        with self.assertNumQueries(0):
+            second = self.render()
+        self.assertIn('rqc_grade_reviews', second)
+        self.assertIn('csrfmiddlewaretoken', second)
+        self.assertNotIn(CSRF_TOKEN_PLACEHOLDER, second)
+        # Every request gets its own masked token.
+        self.assertNotEqual(first, second)
+
+    def test_review_assignment_change_invalidates_cache(self):
+        """Tests that saving a review assignment of the article renders the action again."""
+        self.review_assignment.is_complete = True
+        self.review_assignment.save()
+        self.review_assignment_two.is_complete = True
+        self.review_assignment_two.date_requested = self.review_assignment.date_requested
+        self.review_assignment_two.date_accepted = self.review_assignment.date_accepted
+        self.review_assignment_two.save()
+        self.assertNotIn('not all reviews have yet arrived', self.render())
+        self.review_assignment_two.is_complete = False
+        self.review_assignment_two.save()
+        self.assertIn('not all reviews have yet arrived', self.render())
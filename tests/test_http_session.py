@@ -0,0 +1,34 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the pooled HTTP session used for calls to RQC.
+"""
+from unittest import TestCase
+from unittest.mock import patch
+
+from plugins.rqc_adapter import http_session
+from plugins.rqc_adapter.config import POOL_MAXSIZE
+
+
+class TestHTTPSession(TestCase):
+
+    def setUp(self):
+        http_session.reset_session()
+        self.addCleanup(http_session.reset_session)
+
+    def test_session_is_reused(self):
+        """Tests that subsequent calls in one process share the session."""
+        self.assertIs(http_session.get_session(), http_session.get_session())
+
+    def test_new_session_after_fork(self):
+        """Tests that a forked process does not reuse the connections of its parent."""
+        parent_session = http_session.get_session()
+        with patch('plugins.rqc_adapter.http_session.os.getpid', return_value=-1):
+            child_session = http_session.get_session()
+        self.assertIsNot(parent_session, child_session)
+
+    def test_connection_pool_is_sized(self):
+        """Tests that the adapter uses the configured pool size and no urllib3 retries."""
+        adapter = http_session.get_session().get_adapter('https://reviewqualitycollector.org/api')
+        self.assertEqual(adapter._pool_maxsize, POOL_MAXSIZE)
+        self.assertEqual(adapter.max_retries.total, 0)
@@ -0,0 +1,45 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the optional in-process dispatcher.
+"""
+import threading
+from datetime import timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+from plugins.rqc_adapter.in_process_dispatcher import InProcessDispatcher
+from plugins.rqc_adapter.utils import utc_now
+
+
+class TestInProcessDispatcher(TestCase):
+
+    def setUp(self):
+        self.dispatcher = InProcessDispatcher(max_workers=1, max_queue_size=2)
+        self.addCleanup(self.dispatcher.shutdown)
+
+    def test_queue_is_bounded(self):
+        """Tests that calls that don't fit into the queue are rejected and left to the database queue."""
+        later = utc_now() + timedelta(hours=1)
+        self.assertTrue(self.dispatcher.submit(1, later))
+        self.assertTrue(self.dispatcher.submit(2, later))
+        self.assertFalse(self.dispatcher.submit(3, later))
+        # Rescheduling a call that is already scheduled is always possible.
+        self.assertTrue(self.dispatcher.submit(1, later + timedelta(minutes=1)))
+
+    def test_due_call_is_made_once(self):
+        """Tests that a rescheduled call is only made once, at its latest due time."""
+        made = threading.Event()
+        calls = []
+
+        def make_claimed_call(delayed_call_pk):
+            calls.append(delayed_call_pk)
+            made.set()
+
+        with patch.object(self.dispatcher, '_make_claimed_call', side_effect=make_claimed_call), \
+                patch('plugins.rqc_adapter.in_process_dispatcher.connections'):
+            self.dispatcher.submit(1, utc_now() + timedelta(hours=1))
+            self.dispatcher.submit(1, utc_now())
+            self.assertTrue(made.wait(timeout=5))
+            self.dispatcher.shutdown()
+        self.assertEqual(calls, [1])
@@ -0,0 +1,87 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the process-local cache of the RQC configuration of the journals.
+"""
+import time
+from unittest.mock import Mock, patch
+
+from plugins.rqc_adapter.config import JOURNAL_CONFIG_CACHE_TTL
+from plugins.rqc_adapter.events import create_review_assignment_opting_decision, implicit_call_mhs_submission
+from plugins.rqc_adapter.journal_config import get_journal_config, get_generation, is_rqc_enabled, \
+    preload_journal_configs
+from plugins.rqc_adapter.models import RQCConfigGeneration, RQCJournalAPICredentials, RQCJournalSalt
+from plugins.rqc_adapter.tests.base_test import RQCAdapterBaseTestCase
+
+
+class TestJournalConfigCache(RQCAdapterBaseTestCase):
+
+    def test_config_is_cached(self):
+        """Tests that the configuration is loaded once and then read from memory."""
+        self.create_journal_credentials(self.journal_one, 1, 'cachedkey')
+        RQCJournalSalt.objects.create(journal=self.journal_one, salt='cachedsalt')
+        config = get_journal_config(self.journal_one.pk)
+        self.assertTrue(config.enabled)
+        self.assertEqual(config.rqc_journal_id, 1)
+        self.assertEqual(config.api_key, 'cachedkey')
+        self.assertEqual(config.salt, 'cachedsalt')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_journal_config(self.journal_one.pk), config)
+
+    def test_journal_without_credentials_is_disabled(self):
+        """Tests that journals without credentials are cached as disabled."""
+        self.assertFalse(get_journal_config(self.journal_two.pk).enabled)
+        with self.assertNumQueries(0):
+            self.assertFalse(get_journal_config(self.journal_two.pk).enabled)
+
+    def test_changes_in_this_process_are_seen_immediately(self):
+        """Tests that saving or deleting credentials drops the cached configuration and increments the generation."""
+        self.assertFalse(get_journal_config(self.journal_one.pk).enabled)
+        generation = get_generation()
+        RQCJournalAPICredentials.objects.update_or_create(journal=self.journal_one,
+                                                          defaults={'rqc_journal_id': 2, 'api_key': 'newkey'})
+        self.assertEqual(get_generation(), generation + 1)
+        self.assertEqual(get_journal_config(self.journal_one.pk).api_key, 'newkey')
+        RQCJournalAPICredentials.objects.filter(journal=self.journal_one).delete()
+        self.assertFalse(get_journal_config(self.journal_one.pk).enabled)
+
+    def test_changes_in_other_processes_are_seen_after_ttl(self):
+        """Tests that the configuration is loaded again once the generation counter changed and the TTL passed."""
+        self.create_journal_credentials(self.journal_one, 1, 'oldkey')
+        self.assertEqual(get_journal_config(self.journal_one.pk).api_key, 'oldkey')
+        # Another process changes the credentials. Bulk updates don't send signals to this process.
+        RQCJournalAPICredentials.objects.filter(journal=self.journal_one).update(api_key='newkey')
+        RQCConfigGeneration.objects.filter(pk=1).update(generation=get_generation() + 1)
+        self.assertEqual(get_journal_config(self.journal_one.pk).api_key, 'oldkey')
+        with patch('plugins.rqc_adapter.journal_config.time.monotonic',
+                   return_value=time.monotonic() + JOURNAL_CONFIG_CACHE_TTL + 1):
+            self.assertEqual(get_journal_config(self.journal_one.pk).api_key, 'newkey')
+
+
+class TestEnabledJournals(RQCAdapterBaseTestCase):
+
+    def test_journals_without_rqc_need_no_query(self):
+        """Tests that after preloading, checking a journal without RQC makes no query."""
+        self.create_journal_credentials(self.journal_one, 1, 'enabledkey')
+        preload_journal_configs()
+        with self.assertNumQueries(0):
+            self.assertTrue(is_rqc_enabled(self.journal_one.pk))
+            self.assertFalse(is_rqc_enabled(self.journal_two.pk))
+
+    def test_enabled_journals_follow_credential_changes(self):
+        """Tests that the set of enabled journals is updated when credentials are saved or deleted."""
+        preload_journal_configs()
+        self.assertFalse(is_rqc_enabled(self.journal_two.pk))
+        self.create_journal_credentials(self.journal_two, 2, 'newkey')
+        self.assertTrue(is_rqc_enabled(self.journal_two.pk))
+        RQCJournalAPICredentials.objects.filter(journal=self.journal_two).delete()
+        self.assertFalse(is_rqc_enabled(self.journal_two.pk))
+
+    def test_events_of_journals_without_rqc_need_no_query(self):
+        """Tests that the event handlers return without a query for journals without RQC."""
+        request = Mock(journal=self.journal_one)
+        preload_journal_configs()
+        with self.assertNumQueries(0):
+            self.assertIsNone(implicit_call_mhs_submission(article=self.active_article))
+            self.assertIsNone(create_review_assignment_opting_decision(review_assignment=self.review_assignment,
+                                                                       request=request))
@@ -0,0 +1,38 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the formatting of logged values.
+"""
+import logging
+from unittest import TestCase
+from unittest.mock import patch
+
+from plugins.rqc_adapter.log_formatting import LogValue, format_log_value
+
+
+class TestLogFormatting(TestCase):
+
+    def test_long_fields_are_truncated(self):
+        """Tests that long strings within data structures and long values are truncated."""
+        review_set = [{'visible_id': '1', 'text': 'ü' * 1000}]
+        formatted = format_log_value(review_set, max_field_bytes=100, max_bytes=10000)
+        self.assertIn('ü' * 50 + '... [1900 bytes truncated]', formatted)
+        self.assertIn("'visible_id': '1'", formatted)
+        formatted = format_log_value(b'x' * 1000, max_bytes=100)
+        self.assertEqual(formatted, 'x' * 100 + '... [900 bytes truncated]')
+
+    def test_emails_and_tokens_are_redacted(self):
+        """Tests that email addresses and bearer tokens don't appear in the log."""
+        formatted = format_log_value({'email': 'reviewer@example.com',
+                                      'Authorization': 'Bearer secret-api-key'})
+        self.assertNotIn('reviewer@', formatted)
+        self.assertIn('r***@example.com', formatted)
+        self.assertNotIn('secret-api-key', formatted)
+
+    def test_values_are_only_formatted_when_emitted(self):
+        """Tests that nothing is formatted for messages below the level of the logger."""
+        logger = logging.getLogger('rqc_adapter_log_formatting_test')
+        logger.setLevel(logging.INFO)
+        with patch('plugins.rqc_adapter.log_formatting.format_log_value') as mock_format:
+            logger.debug('Data: %s', LogValue({'text': 'Review'}))
+        mock_format.assert_not_called()
@@ -0,0 +1,40 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the headers of calls to the RQC API.
+"""
+from unittest import TestCase
+from unittest.mock import patch
+
+from plugins.rqc_adapter import request_headers
+
+
+class TestRequestHeaders(TestCase):
+
+    def setUp(self):
+        request_headers.reset_static_headers()
+        self.addCleanup(request_headers.reset_static_headers)
+        patcher = patch('plugins.rqc_adapter.request_headers.get_janeway_version', return_value='1.8.0')
+        self.mock_get_janeway_version = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_static_headers_are_built_once(self):
+        """Tests that the Janeway version is loaded once and only the per-call headers differ."""
+        first_headers = request_headers.build_headers('first_key')
+        second_headers = request_headers.build_headers('second_key', use_post=True)
+        self.mock_get_janeway_version.assert_called_once()
+        self.assertEqual(first_headers['X-Rqc-Mhs-Version'], 'Janeway 1.8.0')
+        self.assertEqual(first_headers['Authorization'], 'Bearer first_key')
+        self.assertEqual(second_headers['Authorization'], 'Bearer second_key')
+        self.assertIn('X-Rqc-Time', second_headers)
+        self.assertNotIn('Content-Type', first_headers)
+        self.assertEqual(second_headers['Content-Type'], 'application/json')
+        # The per-call headers must not leak into the shared static headers.
+        self.assertNotIn('Authorization', request_headers.get_static_headers())
+
+    def test_version_change_rebuilds_headers(self):
+        """Tests that the static headers are built again after a Version was saved."""
+        request_headers.build_headers('key')
+        self.mock_get_janeway_version.return_value = '1.9.0'
+        request_headers.reset_static_headers(sender=None)
+        self.assertEqual(request_headers.build_headers('key')['X-Rqc-Mhs-Version'], 'Janeway 1.9.0')
@@ -0,0 +1,239 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the HTTP level of calls to the RQC API.
+"""
+import gzip
+import time
+from unittest.mock import Mock, patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from plugins.rqc_adapter import rqc_calls
+from plugins.rqc_adapter.circuit_breaker import CircuitBreaker
+from plugins.rqc_adapter.config import FAST_RETRY_MAX_ATTEMPTS, REQUEST_COMPRESSION_MIN_BYTES, REQUEST_TIMEOUTS
+from plugins.rqc_adapter.serialization import decode_json
+
+
+class TestRequestCompression(SimpleTestCase):
+
+    url = 'https://example.com/api/mhs_submission/1/1'
+    large_body = b'{"text":"' + b'a' * REQUEST_COMPRESSION_MIN_BYTES + b'"}'
+
+    def setUp(self):
+        patcher = patch.object(rqc_calls, '_compression_rejected', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def create_session(*status_codes, text=''):
+        session = Mock()
+        session.post.side_effect = [Mock(status_code=status_code, text=text) for status_code in status_codes]
+        return session
+
+    def test_large_body_is_compressed(self):
+        """Tests that bodies above the threshold are sent gzip-compressed."""
+        session = self.create_session(200)
+        rqc_calls.post_body(session, self.url, self.large_body, {}, compress=True)
+        kwargs = session.post.call_args.kwargs
+        self.assertEqual(kwargs['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(kwargs['data']), self.large_body)
+
+    def test_small_body_is_not_compressed(self):
+        """Tests that bodies below the threshold and calls without compress are sent as they are."""
+        session = self.create_session(200, 200)
+        rqc_calls.post_body(session, self.url, b'{}', {}, compress=True)
+        rqc_calls.post_body(session, self.url, self.large_body, {}, compress=False)
+        for call in session.post.call_args_list:
+            self.assertNotIn('Content-Encoding', call.kwargs['headers'])
+
+    def test_rejected_compression_falls_back_to_identity(self):
+        """Tests that a rejected compressed body is sent again uncompressed and compression is turned off."""
+        session = self.create_session(415, 200, 200)
+        response = rqc_calls.post_body(session, self.url, self.large_body, {}, compress=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.post.call_args.kwargs['data'], self.large_body)
+        self.assertNotIn('Content-Encoding', session.post.call_args.kwargs['headers'])
+        self.assertTrue(rqc_calls._compression_rejected)
+        rqc_calls.post_body(session, self.url, self.large_body, {}, compress=True)
+        self.assertEqual(session.post.call_count, 3)
+        self.assertNotIn('Content-Encoding', session.post.call_args.kwargs['headers'])
+
+
+    def test_decoding_error_falls_back_to_identity(self):
+        """Tests that a 400 that reports a decoding failure is treated like a rejected compression."""
+        session = self.create_session(400, 200, text='{"error": "JSON parse error - \'utf-8\' codec can\'t decode byte"}')
+        response = rqc_calls.post_body(session, self.url, self.large_body, {}, compress=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session.post.call_count, 2)
+
+    def test_invalid_data_is_not_sent_again(self):
+        """Tests that a 400 for invalid submission data is returned without sending the body again."""
+        session = self.create_session(400, text='{"review_set": ["This field is required."]}')
+        response = rqc_calls.post_body(session, self.url, self.large_body, {}, compress=True)
+        self.assertEqual(response.status_code, 400)
+        session.post.assert_called_once()
+        self.assertEqual(session.post.call_args.kwargs['headers']['Content-Encoding'], 'gzip')
+        self.assertFalse(rqc_calls._compression_rejected)
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'rqc-adapter-circuit-breaker-tests'}})
+class TestCircuitBreaker(SimpleTestCase):
+
+    def setUp(self):
+        self.circuit_breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=60)
+        self.addCleanup(self.circuit_breaker.record_success, probe=True)
+
+    def open_circuit_breaker(self):
+        for _ in range(3):
+            self.circuit_breaker.record_failure()
+
+    def test_opens_after_failures_in_a_row(self):
+        """Tests that the breaker opens after the threshold is reached and that successes reset the count."""
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_success()
+        self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.CLOSED)
+        self.circuit_breaker.record_failure()
+        self.circuit_breaker.record_failure()
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.circuit_breaker.allow_request())
+
+    def test_single_probe_after_reset_timeout(self):
+        """Tests that only one call is let through after the reset timeout and that its result decides the state."""
+        self.open_circuit_breaker()
+        with patch('plugins.rqc_adapter.circuit_breaker.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.circuit_breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertEqual(self.circuit_breaker.acquire(), CircuitBreaker.HALF_OPEN)
+            self.assertFalse(self.circuit_breaker.allow_request())
+            self.circuit_breaker.record_failure(probe=True)
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.OPEN)
+        # The failed probe opened the breaker for another reset timeout.
+        with patch('plugins.rqc_adapter.circuit_breaker.time.time', return_value=time.time() + 122):
+            self.assertEqual(self.circuit_breaker.acquire(), CircuitBreaker.HALF_OPEN)
+            self.circuit_breaker.record_success(probe=True)
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.circuit_breaker.allow_request())
+
+    def test_calls_in_flight_dont_close_the_breaker(self):
+        """Tests that results of calls that were made before the breaker opened don't change its state."""
+        self.open_circuit_breaker()
+        self.circuit_breaker.record_success()
+        self.assertEqual(self.circuit_breaker.state, CircuitBreaker.OPEN)
+        with patch('plugins.rqc_adapter.circuit_breaker.time.time', return_value=time.time() + 61):
+            self.circuit_breaker.record_success()
+            self.assertEqual(self.circuit_breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_server_errors_of_single_submissions_are_not_counted(self):
+        """Tests that a 500 is not counted as RQC being unavailable, while 503 is."""
+        with patch('plugins.rqc_adapter.rqc_calls.get_circuit_breaker', return_value=self.circuit_breaker), \
+                patch('plugins.rqc_adapter.rqc_calls.request_rqc_api') as mock_request:
+            mock_request.return_value = {'success': False, 'http_status_code': 500}
+            for _ in range(3):
+                rqc_calls.call_rqc_api('https://example.com/api/mhs_submission/1/1', 'key')
+            self.assertEqual(self.circuit_breaker.state, CircuitBreaker.CLOSED)
+            mock_request.return_value = {'success': False, 'http_status_code': 503}
+            for _ in range(3):
+                rqc_calls.call_rqc_api('https://example.com/api/mhs_submission/1/1', 'key')
+            self.assertEqual(self.circuit_breaker.state, CircuitBreaker.OPEN)
+
+    def test_open_breaker_fails_calls_immediately(self):
+        """Tests that no request is made while the breaker is open."""
+        self.open_circuit_breaker()
+        with patch('plugins.rqc_adapter.rqc_calls.get_circuit_breaker', return_value=self.circuit_breaker), \
+                patch('plugins.rqc_adapter.rqc_calls.request_rqc_api') as mock_request:
+            result = rqc_calls.call_rqc_api('https://example.com/api/mhs_apikeycheck/1', 'key')
+        mock_request.assert_not_called()
+        self.assertFalse(result['success'])
+        self.assertEqual(result['http_status_code'], rqc_calls.RQCErrorCodes.CIRCUIT_OPEN)
+
+
+class TestDeadline(SimpleTestCase):
+
+    def test_timeouts_of_context_are_used(self):
+        """Tests that requests get the connect and read timeouts configured for the call context."""
+        session = Mock()
+        session.post.return_value = Mock(status_code=200)
+        deadline = rqc_calls.Deadline.for_context(rqc_calls.RQCCallContext.INTERACTIVE)
+        rqc_calls.post_body(session, 'https://example.com', b'{}', {}, deadline=deadline)
+        timeouts = REQUEST_TIMEOUTS['interactive']
+        connect_timeout, read_timeout = session.post.call_args.kwargs['timeout']
+        self.assertEqual(connect_timeout, timeouts['connect'])
+        self.assertEqual(read_timeout, timeouts['read'])
+
+    def test_timeouts_are_shortened_to_the_deadline(self):
+        """Tests that no request may take longer than the time left for the call."""
+        deadline = rqc_calls.Deadline(connect_timeout=3, read_timeout=60, budget=5)
+        connect_timeout, read_timeout = deadline.request_timeout()
+        self.assertEqual(connect_timeout, 3)
+        self.assertLessEqual(read_timeout, 5)
+        with patch('plugins.rqc_adapter.rqc_calls.time.monotonic', return_value=deadline.expires_at + 1):
+            with self.assertRaises(requests.Timeout):
+                deadline.request_timeout()
+
+
+@patch('plugins.rqc_adapter.rqc_calls.time.sleep')
+class TestFastRetries(SimpleTestCase):
+
+    @staticmethod
+    def create_send(*outcomes):
+        return Mock(side_effect=[outcome if isinstance(outcome, Exception) else Mock(status_code=outcome)
+                                 for outcome in outcomes])
+
+    def test_transient_failures_are_retried(self, mock_sleep):
+        """Tests that 503 responses and reset connections are retried until the request succeeds."""
+        send = self.create_send(503, requests.ConnectionError('Connection reset by peer'), 200)
+        response = rqc_calls.send_with_retries(send, rqc_calls.Deadline(3, 10, 30))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(send.call_count, 3)
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    def test_retries_stop_after_max_attempts(self, mock_sleep):
+        """Tests that the last failure is returned once FAST_RETRY_MAX_ATTEMPTS requests were made."""
+        send = self.create_send(*[502] * FAST_RETRY_MAX_ATTEMPTS)
+        response = rqc_calls.send_with_retries(send, rqc_calls.Deadline(3, 10, 30))
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(send.call_count, FAST_RETRY_MAX_ATTEMPTS)
+
+    def test_no_retry_without_time_left(self, mock_sleep):
+        """Tests that no retry is made if it would not fit into the deadline."""
+        send = self.create_send(requests.ConnectionError('Connection reset by peer'), 200)
+        with self.assertRaises(requests.ConnectionError):
+            rqc_calls.send_with_retries(send, rqc_calls.Deadline(3, 10, 1))
+        send.assert_called_once()
+        mock_sleep.assert_not_called()
+
+    def test_other_failures_are_not_retried(self, mock_sleep):
+        """Tests that client errors, server errors other than 502-504 and timeouts are not retried."""
+        for outcome in (400, 500, requests.ConnectTimeout('Connect timeout')):
+            send = self.create_send(outcome, 200)
+            try:
+                rqc_calls.send_with_retries(send, rqc_calls.Deadline(3, 10, 30))
+            except requests.Timeout:
+                pass
+            send.assert_called_once()
+        mock_sleep.assert_not_called()
+
+
+class TestSubmissionDataEncoding(SimpleTestCase):
+
+    post_data = {'interactive_user': '', 'mhs_submissionpage': '', 'title': 'Encoded Article', 'review_set': []}
+
+    def test_interactive_fields_are_not_hashed(self):
+        """Tests that interactive data has the same hash as non-interactive data and is sent with the user."""
+        body, payload_hash = rqc_calls.encode_submission_data(self.post_data)
+        interactive_post_data = {**self.post_data, 'interactive_user': 'editor@example.com',
+                                 'mhs_submissionpage': 'https://example.com'}
+        interactive_body, interactive_payload_hash = rqc_calls.encode_submission_data(interactive_post_data)
+        self.assertEqual(interactive_payload_hash, payload_hash)
+        self.assertEqual(decode_json(body), self.post_data)
+        self.assertEqual(decode_json(interactive_body), interactive_post_data)
+
+    def test_preparation_errors_are_returned(self):
+        """Tests that an error before the request is returned as an unknown error instead of being raised."""
+        with patch.object(rqc_calls, 'encode_json', side_effect=TypeError('not serializable')):
+            result = rqc_calls.call_mhs_submission(1, 'key', 1, self.post_data)
+        self.assertFalse(result['success'])
+        self.assertEqual(result['http_status_code'], rqc_calls.RQCErrorCodes.UNKNOWN_ERROR)
@@ -0,0 +1,105 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the JSON encoding of the data sent to RQC.
+"""
+from datetime import timedelta
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.utils import timezone
+
+import review.models
+from plugins.rqc_adapter import serialization
+from plugins.rqc_adapter.models import RQCJournalSalt
+from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
+from plugins.rqc_adapter.tests.base_test import RQCAdapterBaseTestCase
+from utils.testing import helpers
+
+
+class TestSerialization(TestCase):
+
+    data = {'title': 'Überprüfung', 'review_set': [{'visible_id': '1', 'is_html': True}], 'decision': ''}
+
+    def assert_canonical(self):
+        reordered_data = {'decision': '', 'review_set': [{'is_html': True, 'visible_id': '1'}], 'title': 'Überprüfung'}
+        encoded = serialization.encode_json(self.data)
+        self.assertEqual(encoded, serialization.encode_json(reordered_data))
+        self.assertIn('Überprüfung'.encode('utf-8'), encoded)
+        self.assertNotIn(b' ', encoded)
+        self.assertEqual(serialization.decode_json(encoded), self.data)
+
+    def test_encoding_is_canonical(self):
+        """Tests that equal data results in equal compact UTF-8 bytes."""
+        self.assert_canonical()
+
+    def test_encoding_without_orjson(self):
+        """Tests the encoding with the json module of the standard library."""
+        with patch.object(serialization, 'orjson', None):
+            self.assert_canonical()
+
+    def test_encoders_agree(self):
+        """Tests that orjson and the json module produce the same bytes, so that hashes stay comparable."""
+        if serialization.orjson is None:
+            self.skipTest('orjson is not installed.')
+        encoded = serialization.encode_json(self.data)
+        with patch.object(serialization, 'orjson', None):
+            self.assertEqual(encoded, serialization.encode_json(self.data))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'rqc-adapter-serialization-tests'}})
+class TestSerializationOfSubmissionData(RQCAdapterBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.create_journal_credentials(self.journal_one, 1, 'serializationkey')
+        RQCJournalSalt.objects.get_or_create(journal=self.journal_one, defaults={'salt': 'serializationsalt'})
+
+    def create_submission_data(self) -> dict:
+        """Collects the submission data of an article with non-ASCII names, missing values and dates."""
+        author = self.create_author(self.journal_one, 'juergen.uenal@example.com')
+        author.first_name = 'Jürgen'
+        author.last_name = 'Ünal 李'
+        author.orcid = None
+        author.save()
+        article = self.create_article(self.journal_one, 'Über die Qualität von Gutachten – 質', author)
+        article.correspondence_author = author
+        article.date_submitted = timezone.now() - timedelta(days=3)
+        article.save()
+        helpers.create_editor_assignment(article, self.editor)
+
+        reviewer = helpers.create_user('zoe.oeztuerk@example.com', ['reviewer'], journal=self.journal_one)
+        reviewer.first_name = 'Zoë'
+        reviewer.last_name = 'Öztürk'
+        reviewer.save()
+        review_assignment = helpers.create_review_assignment(
+            journal=self.journal_one,
+            article=article,
+            reviewer=reviewer,
+            editor=self.editor,
+            due_date=timezone.now() + timedelta(weeks=2),
+        )
+        review_assignment.date_accepted = timezone.now()
+        review_assignment.save()
+        review.models.ReviewAssignmentAnswer.objects.create(assignment=review_assignment,
+                                                            answer='<p>Schöne Grüße, «très bien» 👍</p>')
+        self.create_reviewer_opting_decision_for_ReviewAssignment(review_assignment, self.OPT_IN)
+        return fetch_post_data(article, self.journal_one)
+
+    def test_encoders_agree_on_submission_data(self):
+        """Tests that orjson and the json module produce the same bytes for the data sent to RQC."""
+        if serialization.orjson is None:
+            self.skipTest('orjson is not installed.')
+        submission_data = self.create_submission_data()
+        # Make sure that the data contains what the encoders could disagree on.
+        self.assertEqual(submission_data['author_set'][0]['lastname'], 'Ünal 李')
+        self.assertIsNone(submission_data['author_set'][0]['orcid_id'])
+        self.assertEqual(len(submission_data['review_set']), 1)
+        self.assertIsInstance(submission_data['submitted'], str)
+
+        encoded = serialization.encode_json(submission_data)
+        with patch.object(serialization, 'orjson', None):
+            self.assertEqual(encoded, serialization.encode_json(submission_data))
+        self.assertEqual(serialization.decode_json(encoded), submission_data)
@@ -0,0 +1,271 @@
+"""
+© Julius Harms, Freie Universität Berlin 2025
+
+This file contains tests for the number of database queries needed to collect the submission data
+and for the cache of the submission data.
+"""
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+import review.models
+import submission.models
+from review.const import EditorialDecisions
+from review.models import DecisionDraft
+from plugins.rqc_adapter import submission_data_retrieval
+from plugins.rqc_adapter.models import RQCCall, RQCDataVersion, RQCJournalSalt
+from plugins.rqc_adapter.payload_cache import bump_payload_version, get_payload_version, invalidate_payload, \
+    review_version_key, version_key
+from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data, get_authors_info, get_reviews_info, \
+    get_editors_info, load_article_context
+from plugins.rqc_adapter.tests.base_test import RQCAdapterBaseTestCase
+from utils.testing import helpers
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                             'LOCATION': 'rqc-adapter-submission-data-tests'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestSubmissionDataQueries(RQCAdapterBaseTestCase):
+
+    # Article with its annotations, editor assignments, decision drafts, review assignments,
+    # version stamps and review form answers
+    ARTICLE_CONTEXT_QUERY_BUDGET = 6
+    # Editor assignments and decision drafts are not loaded if a call was already made
+    # and review form answers are not loaded if all reviews are cached
+    ARTICLE_CONTEXT_WITH_CALL_QUERY_BUDGET = 3
+    # The version stamp of the article is read before the article context is loaded
+    PAYLOAD_VERSION_QUERIES = 1
+    # Review form answers of the reviews that are not cached
+    REVIEW_FORM_ANSWERS_QUERIES = 1
+
+    def setUp(self):
+        super().setUp()
+        self.create_journal_credentials(self.journal_one, 1, 'budgetkey')
+
+    def create_accepted_review_assignments(self, article, count):
+        """Creates review assignments with answers. Every second reviewer is opted in."""
+        for num in range(count):
+            reviewer = helpers.create_user(f'budget_reviewer_{article.pk}_{num}@example.com', ['reviewer'], journal=self.journal_one)
+            review_assignment = helpers.create_review_assignment(
+                journal=self.journal_one,
+                article=article,
+                reviewer=reviewer,
+                editor=self.editor,
+                due_date=timezone.now() + timedelta(weeks=2),
+            )
+            review_assignment.date_accepted = timezone.now()
+            review_assignment.save()
+            review.models.ReviewAssignmentAnswer.objects.create(assignment=review_assignment,
+                                                                answer=f'<p>Answer {num}</p>')
+            opting_status = self.OPT_IN if num % 2 == 0 else self.OPT_OUT
+            self.create_reviewer_opting_decision_for_ReviewAssignment(review_assignment, opting_status)
+
+    def test_reviews_info_query_budget(self):
+        """Tests that the number of queries for the review set does not grow with the number of reviews."""
+        RQCJournalSalt.objects.get_or_create(journal=self.journal_one, defaults={'salt': 'budgetsalt'})
+        for count in [1, 20, 50]:
+            with self.subTest(count=count):
+                article = self.create_article(self.journal_one, f'Budget Article {count}', self.author)
+                self.create_accepted_review_assignments(article, count)
+                with self.assertNumQueries(self.ARTICLE_CONTEXT_QUERY_BUDGET):
+                    context = load_article_context(article, self.journal_one)
+                with self.assertNumQueries(0):
+                    review_set = get_reviews_info(context)
+                self.assertEqual(len(review_set), min(count, 20))
+
+    def create_editorial_history(self, article, count):
+        """Creates editor assignments and decision drafts with a distinct editor each."""
+        for num in range(count):
+            editor = helpers.create_user(f'budget_editor_{article.pk}_{num}@example.com', ['editor'],
+                                         journal=self.journal_one)
+            section_editor = helpers.create_user(f'budget_section_editor_{article.pk}_{num}@example.com', ['editor'],
+                                                 journal=self.journal_one)
+            helpers.create_editor_assignment(article, editor)
+            helpers.create_editor_assignment(article, section_editor, assignment_type='section_editor')
+            DecisionDraft.objects.create(editor=editor,
+                                         article=article,
+                                         section_editor=section_editor,
+                                         decision=EditorialDecisions.ACCEPT.value,
+                                         editor_decision=EditorialDecisions.ACCEPT.value)
+
+    def test_editors_info_query_budget(self):
+        """Tests that the number of queries for the editor assignment set does not grow with the editorial history."""
+        for count in [1, 10]:
+            with self.subTest(count=count):
+                article = self.create_article(self.journal_one, f'Editors Budget Article {count}', self.author)
+                self.create_editorial_history(article, count)
+                with self.assertNumQueries(self.ARTICLE_CONTEXT_QUERY_BUDGET):
+                    context = load_article_context(article, self.journal_one)
+                with self.assertNumQueries(0):
+                    edassgmt_set = get_editors_info(context)
+                self.assertEqual(len(edassgmt_set), min(2 * count, 20))
+                self.assertEqual(edassgmt_set[0]['level'], 1)
+
+    def test_order_of_correspondence_author(self):
+        """Tests that the order of the correspondence author is taken from the same frozen author as before."""
+        article = self.create_article(self.journal_one, 'Frozen Authors Article', self.author)
+        co_author = helpers.create_user(f'frozen_co_author_{article.pk}@example.com', ['author'],
+                                        journal=self.journal_one)
+        article.correspondence_author = self.author
+        article.save()
+        submission.models.FrozenAuthor.objects.filter(article=article).delete()
+        submission.models.FrozenAuthor.objects.create(article=article, author=co_author, order=0)
+        # Two records of the correspondence author, the one with the lower primary key has the higher order.
+        submission.models.FrozenAuthor.objects.create(article=article, author=self.author, order=3)
+        submission.models.FrozenAuthor.objects.create(article=article, author=self.author, order=1)
+        expected_order = article.frozenauthor_set.filter(author=self.author).first().order + 1
+        author_set = get_authors_info(load_article_context(article, self.journal_one))
+        self.assertEqual(author_set[0]['email'], self.author.email)
+        self.assertEqual(author_set[0]['order_number'], expected_order)
+
+    def test_fetch_post_data_query_budget(self):
+        """Tests that the complete submission data is collected with a fixed number of queries."""
+        RQCJournalSalt.objects.get_or_create(journal=self.journal_one, defaults={'salt': 'budgetsalt'})
+        article = self.create_article(self.journal_one, 'Post Data Budget Article', self.author)
+        self.create_editorial_history(article, 3)
+        self.create_accepted_review_assignments(article, 5)
+        with self.assertNumQueries(self.PAYLOAD_VERSION_QUERIES + self.ARTICLE_CONTEXT_QUERY_BUDGET):
+            post_data = fetch_post_data(article, self.journal_one)
+        self.assertEqual(len(post_data['review_set']), 5)
+        self.assertEqual(post_data['decision'], '')
+
+        RQCCall.objects.create(article=article, editor_assignments=post_data['edassgmt_set'])
+        with self.subTest('reviews cached'):
+            with self.assertNumQueries(self.PAYLOAD_VERSION_QUERIES + self.ARTICLE_CONTEXT_WITH_CALL_QUERY_BUDGET):
+                post_data_after_call = fetch_post_data(article, self.journal_one)
+            self.assertEqual(post_data_after_call['edassgmt_set'], post_data['edassgmt_set'])
+            self.assertEqual(post_data_after_call['review_set'], post_data['review_set'])
+
+        with self.subTest('review changed'):
+            # The first reviewer is opted in, so the text of the review is sent.
+            first_review_assignment = article.reviewassignment_set.order_by('date_requested').first()
+            answer = review.models.ReviewAssignmentAnswer.objects.filter(assignment=first_review_assignment).first()
+            answer.answer = '<p>Changed budget answer</p>'
+            answer.save()
+            with self.assertNumQueries(self.PAYLOAD_VERSION_QUERIES + self.ARTICLE_CONTEXT_WITH_CALL_QUERY_BUDGET
+                                       + self.REVIEW_FORM_ANSWERS_QUERIES):
+                post_data_after_change = fetch_post_data(article, self.journal_one)
+            self.assertIn('Changed budget answer', post_data_after_change['review_set'][0]['text'])
+            self.assertEqual(post_data_after_change['review_set'][1:], post_data['review_set'][1:])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TestPayloadCache(RQCAdapterBaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Changes are only tracked for journals that use RQC.
+        self.create_journal_credentials(self.journal_one, 1, 'cachekey')
+        RQCJournalSalt.objects.get_or_create(journal=self.journal_one, defaults={'salt': 'cachesalt'})
+        self.article = self.create_article(self.journal_one, 'Cached Article', self.author)
+        self.reviewer = helpers.create_user(f'cache_reviewer_{self.article.pk}@example.com', ['reviewer'],
+                                            journal=self.journal_one)
+        self.review_assignment = helpers.create_review_assignment(
+            journal=self.journal_one,
+            article=self.article,
+            reviewer=self.reviewer,
+            editor=self.editor,
+            due_date=timezone.now() + timedelta(weeks=2),
+        )
+        self.review_assignment.date_accepted = timezone.now()
+        self.review_assignment.save()
+
+    def test_unchanged_article_is_not_loaded_again(self):
+        """Tests that the data of an unchanged article is taken from the cache after reading its version stamp."""
+        post_data = fetch_post_data(self.article, self.journal_one)
+        with self.assertNumQueries(1):
+            cached_post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(cached_post_data, post_data)
+
+    def test_interactive_user_is_not_cached(self):
+        """Tests that the interactive user of one call is not sent in the next call."""
+        post_data = fetch_post_data(self.article, self.journal_one, 'https://example.com', True, self.editor)
+        self.assertEqual(post_data['interactive_user'], self.editor.email)
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['interactive_user'], '')
+        self.assertEqual(post_data['mhs_submissionpage'], '')
+
+    def test_changes_invalidate_the_cached_data(self):
+        """Tests that changes to the reviews and the editorial decision are sent in the next call."""
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['review_set'][0]['reviewer']['firstname'], '')
+
+        self.create_reviewer_opting_decision_for_ReviewAssignment(self.review_assignment, self.OPT_IN)
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['review_set'][0]['reviewer']['email'], self.reviewer.email)
+
+        review.models.ReviewAssignmentAnswer.objects.create(assignment=self.review_assignment,
+                                                            answer='<p>Cached answer</p>')
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['review_set'][0]['text'], '<p>Cached answer</p>')
+
+        self.article.date_declined = timezone.now()
+        self.article.save()
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['decision'], 'REJECT')
+
+    def test_changes_in_other_processes_invalidate_the_cached_data(self):
+        """Tests that the cached data is not used once another process committed a change with a new version stamp."""
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['decision'], '')
+        # Another process declines the article. Its signal handler only replaces the stamp in the database.
+        submission.models.Article.objects.filter(pk=self.article.pk).update(date_declined=timezone.now())
+        bump_payload_version(self.article.pk)
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['decision'], 'REJECT')
+
+    def test_changes_in_journals_without_rqc_are_not_tracked(self):
+        """Tests that saving and deleting objects of a journal without RQC makes no query for version stamps."""
+        article = self.create_article(self.journal_two, 'Article Without RQC', self.author)
+        with CaptureQueriesContext(connection) as queries:
+            article.title = 'Changed Article Without RQC'
+            article.save()
+            editor_assignment = helpers.create_editor_assignment(article, self.editor)
+            editor_assignment.delete()
+        self.assertFalse([query for query in queries if 'rqcdataversion' in query['sql'].lower()])
+
+    def test_raw_saves_are_skipped(self):
+        """Tests that objects saved by loaddata don't replace version stamps."""
+        version = get_payload_version(self.article.pk)
+        invalidate_payload(sender=submission.models.Article, instance=self.article, raw=True)
+        self.assertEqual(get_payload_version(self.article.pk), version)
+
+    def test_deletes_remove_version_stamps(self):
+        """Tests that deleting a review assignment deletes its stamp and creates none."""
+        fetch_post_data(self.article, self.journal_one)
+        key = review_version_key(self.review_assignment.pk)
+        self.assertTrue(RQCDataVersion.objects.filter(key=key).exists())
+        self.review_assignment.delete()
+        self.assertFalse(RQCDataVersion.objects.filter(key=key).exists())
+        self.assertFalse(RQCDataVersion.objects.filter(key=version_key(self.article.pk)).exists())
+        post_data = fetch_post_data(self.article, self.journal_one)
+        self.assertEqual(post_data['review_set'], [])
+
+    def test_only_changed_reviews_are_built_again(self):
+        """Tests that a change of one review only builds that review again and keeps the numbering."""
+        second_reviewer = helpers.create_user(f'cache_second_reviewer_{self.article.pk}@example.com', ['reviewer'],
+                                              journal=self.journal_one)
+        second_review_assignment = helpers.create_review_assignment(
+            journal=self.journal_one,
+            article=self.article,
+            reviewer=second_reviewer,
+            editor=self.editor,
+            due_date=timezone.now() + timedelta(weeks=2),
+        )
+        second_review_assignment.date_accepted = timezone.now()
+        second_review_assignment.save()
+        post_data = fetch_post_data(self.article, self.journal_one)
+
+        self.create_reviewer_opting_decision_for_ReviewAssignment(second_review_assignment, self.OPT_IN)
+        with patch('plugins.rqc_adapter.submission_data_retrieval.get_review_info',
+                   wraps=submission_data_retrieval.get_review_info) as get_review_info:
+            changed_post_data = fetch_post_data(self.article, self.journal_one)
+        get_review_info.assert_called_once()
+        self.assertEqual(changed_post_data['review_set'][0], post_data['review_set'][0])
+        self.assertEqual([review['visible_id'] for review in changed_post_data['review_set']], ['1', '2'])
+        self.assertEqual(changed_post_data['review_set'][1]['reviewer']['email'], second_reviewer.email)
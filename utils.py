@@ -13,7 +13,6 @@ from datetime import datetime, timezone
 from django.conf import settings
 
 from plugins.rqc_adapter.models import RQCReviewerOptingDecision, RQCJournalSalt
-from review.models import RevisionRequest
 
 # As of API version 2023-09-06, RQC does not support file attachments
 def encode_file_as_b64(file_uuid: str, article_id: str) -> str:
@@ -47,25 +46,26 @@ def convert_review_decision_to_rqc_format(decision_string: str) -> str:
         case _:
             return ''
 
-def get_editorial_decision(article):
+def convert_editorial_decision_to_rqc_format(is_accepted: bool, is_declined: bool,
+                                             latest_revision_type: str | None) -> str:
     """
-    Gets the (most recent) editorial decision for the article. The default is empty "".
-    :param article: Article object
-    :return: String of the editorial decision
+    Maps the state of the article to the string representation of the editorial decision in RQC.
+    :param is_accepted: True if the article is accepted
+    :param is_declined: True if the article is declined
+    :param latest_revision_type: Type of the most recent revision request. None if there is none.
+    :return: The string representation of the editorial decision in RQC format. The default is empty "".
     """
-    if article.is_accepted():
+    if is_accepted:
         return 'ACCEPT'
-    elif article.date_declined is not None:
+    elif is_declined:
         return 'REJECT'
+    elif latest_revision_type is None:
+        return ''
+    # Conditional accept gets mapped to 'minor revisions' in RQC.
+    elif latest_revision_type == 'minor_revisions' or latest_revision_type == 'conditional_accept':
+        return 'MINORREVISION'
     else:
-        revision_request = RevisionRequest.objects.filter(article=article).order_by('-date_requested').first()
-        if revision_request is None:
-            return ''
-        # Conditional accept gets mapped to 'minor revisions' in RQC.
-        if revision_request.type == 'minor_revisions' or revision_request.type == 'conditional_accept':
-            return 'MINORREVISION'
-        else:
-            return 'MAJORREVISION'
+        return 'MAJORREVISION'
 
 def create_pseudo_address(email, salt):
     """
@@ -15,9 +15,13 @@ from security import decorators
 from submission import models as submission_models
 
 from plugins.rqc_adapter import forms
-from plugins.rqc_adapter.models import RQCReviewerOptingDecision, RQCDelayedCall, RQCJournalAPICredentials, \
+from plugins.rqc_adapter.dispatcher import enqueue_submission
+from plugins.rqc_adapter.in_process_dispatcher import schedule_on_commit
+from plugins.rqc_adapter.journal_config import get_journal_config
+from plugins.rqc_adapter.models import RQCReviewerOptingDecision, RQCJournalAPICredentials, \
     RQCReviewerOptingDecisionForReviewAssignment
-from plugins.rqc_adapter.rqc_calls import call_mhs_submission, RQCErrorCodes
+from plugins.rqc_adapter.payload_cache import invalidate_review_assignment
+from plugins.rqc_adapter.rqc_calls import call_mhs_submission, RQCCallContext, RQCErrorCodes
 from plugins.rqc_adapter.submission_data_retrieval import fetch_post_data
 
 logger = get_logger(__name__)
@@ -104,9 +108,8 @@ def submit_article_for_grading(request, article_id):
         journal=request.journal,
     )
     journal = article.journal
-    try:
-        api_credentials = RQCJournalAPICredentials.objects.get(journal=journal)
-    except RQCJournalAPICredentials.DoesNotExist:
+    api_credentials = get_journal_config(journal.pk)
+    if not api_credentials.enabled:
         messages.error(request, 'Review Quality Collector API credentials not found.')
         return redirect(mhs_submission_page)
     user = request.user
@@ -114,7 +117,8 @@ def submit_article_for_grading(request, article_id):
     post_data = fetch_post_data(article, journal, mhs_submission_page, is_interactive, user)
     response = call_mhs_submission(journal_id = api_credentials.rqc_journal_id,
                                    api_key = api_credentials.api_key,
-                                   submission_id=article_id, post_data=post_data, article=article)
+                                   submission_id=article_id, post_data=post_data, article=article,
+                                   context=RQCCallContext.INTERACTIVE)
     print(response) #TODO remove
     if not response['success']:
         match response['http_status_code']:
@@ -134,15 +138,14 @@ def submit_article_for_grading(request, article_id):
             case (RQCErrorCodes.CONNECTION_ERROR
                   | RQCErrorCodes.TIMEOUT
                   | RQCErrorCodes.REQUEST_ERROR
+                  | RQCErrorCodes.CIRCUIT_OPEN
                   | 500
                   | 502
                   | 503
                   | 504):
                 messages.error(request, f'Sending the data to RQC failed. There might be a server error on the side of RQC the data will be automatically resent shortly. Details: {response["message"]}')
-                RQCDelayedCall.objects.create(remaining_tries= 10,
-                                                article = article,
-                                                failure_reason = str(response['http_status_code']),
-                                                last_attempt_at = utc_now())
+                delayed_call = enqueue_submission(article, failure_reason=str(response['http_status_code']))
+                schedule_on_commit(delayed_call)
             case _:
                 messages.error(request,
                                       f'Sending the data to RQC failed. Details: {response["message"]}')
@@ -207,6 +210,8 @@ def set_reviewer_opting_status(request):
                     review_assignment__date_declined__isnull=True,
                     review_assignment__date_accepted__isnull=False
                 ).update(opting_status=opting_status, decision_record=decision)
+                # The bulk update sends no signals, so the cached submission data is replaced here.
+                invalidate_review_assignment(assignment)
 
                 return redirect(
                     logic.generate_access_code_url("do_review", assignment, access_code)